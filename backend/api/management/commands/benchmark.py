@@ -0,0 +1,473 @@
+import asyncio
+import base64
+import json
+import math
+import platform
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from itertools import count
+
+import django
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes import images
+from recipes.models import Favorite, Recipe, ShoppingList, Tag
+from users.authentication import forget_token
+from users.models import User
+
+GIF = base64.b64encode(
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9'
+    b'\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00'
+    b'\x02\x02D\x01\x00;'
+).decode()
+IMAGE = f'data:image/gif;base64,{GIF}'
+PERCENTILES = (50, 90, 99)
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted values."""
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def call_async(request, url, headers):
+    """Make a request with the async test client from sync code."""
+    async def call():
+        # AsyncClient of Django 4.2 drops headers given to its constructor.
+        return await request(url, headers=headers)
+    return async_to_sync(call)()
+
+
+def summarize(timings):
+    """Percentiles and mean of latencies in milliseconds."""
+    timings = sorted(timings)
+    latency = {f'p{percent}': round(percentile(timings, percent), 3)
+               for percent in PERCENTILES}
+    latency['mean'] = round(sum(timings) / len(timings), 3)
+    return latency
+
+
+def consume(response):
+    """Read the whole body, streaming responses included."""
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class Command(BaseCommand):
+    help = ('Замер времени ответа, числа запросов к БД и выделенной памяти '
+            'для основных эндпоинтов API на тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Файл для результатов в формате json')
+        parser.add_argument(
+            '--compare',
+            help=('Файл с прошлыми результатами для сравнения: до и после '
+                  'изменения - это прогон прошлой версии кода с --output '
+                  'и прогон новой с --compare на этот файл'))
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help='Допустимый рост p50 при сравнении, в процентах')
+        parser.add_argument(
+            '--iterations', type=int, default=30,
+            help='Количество замеров на сценарий')
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Количество прогревочных запросов на сценарий')
+        parser.add_argument(
+            '--scenario', action='append', default=[],
+            help='Запустить только сценарии, начинающиеся с этой строки')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Параллельных клиентов в нагрузочных сценариях')
+        parser.add_argument(
+            '--load-requests', type=int, default=400,
+            help='Запросов на нагрузочный сценарий')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять тестовую базу после замеров')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--iterations и --concurrency должны быть больше нуля.')
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    previous = json.load(file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Не удалось прочитать результаты: {error}')
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # Pages of the test database must not reach the shared cache
+            # of a running server.
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root,
+                                      CACHES=BENCHMARK_CACHES):
+                self.seed(options)
+                results = self.run_scenarios(options)
+                # Let image variants of created recipes finish writing.
+                images.executor.shutdown(wait=True)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'environment': {
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'dataset': {key: options[key]
+                        for key in ('users', 'recipes', 'tags', 'seed')},
+            'iterations': options['iterations'],
+            'concurrency': options['concurrency'],
+            'scenarios': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2,
+                      sort_keys=True)
+            file.write('\n')
+        self.stdout.write(self.style.SUCCESS(
+            f'Сценариев: {len(results)}, результаты в {options["output"]}.'))
+        if previous is not None:
+            self.compare(previous, report, options['threshold'])
+
+    def seed(self, options):
+        """Fill the test database with a reproducible dataset."""
+        call_command(
+            'seed_data', users=options['users'], recipes=options['recipes'],
+            tags=options['tags'], seed=options['seed'], stdout=StringIO())
+        tags = list(Tag.objects.all())
+        self.user = User.objects.order_by('id').first()
+        self.author = User.objects.order_by('-recipes_count').first()
+        self.tag_slugs = [tag.slug for tag in tags[:2]]
+        self.all_tag_slugs = [tag.slug for tag in tags]
+        self.recipe = Recipe.objects.filter(author=self.user).first() or (
+            Recipe.objects.create(
+                author=self.user, name='Рецепт автора', text='Описание',
+                cooking_time=10, image=''))
+        self.other_recipe = Recipe.objects.exclude(
+            favorite__user=self.user).exclude(
+            shoppinglist__user=self.user).first()
+        self.ingredients = list(Ingredient.objects.all()[:8])
+        self.token = Token.objects.create(user=self.user)
+        # One recipe per parallel client, so clients never race each other.
+        self.load_recipes = list(Recipe.objects.exclude(
+            favorite__user=self.user).exclude(
+            id=self.other_recipe.id)[:options['concurrency']])
+
+    def get_scenarios(self):
+        """Name, callable making one request, untimed setup or None."""
+        anonymous = APIClient()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        async_client = AsyncClient()
+        headers = {'Authorization': f'Token {self.token.key}'}
+        tags = '&'.join(f'tags={slug}' for slug in self.tag_slugs)
+        # Every seeded tag, the filter cost grows with their number.
+        many_tags = '&'.join(f'tags={slug}' for slug in self.all_tag_slugs)
+        recipe_id = self.other_recipe.id
+        filters = {
+            '': '',
+            '_author': f'author={self.author.id}',
+            '_tags': tags,
+            '_tags_all': f'{tags}&tags_mode=all',
+            '_many_tags': many_tags,
+            '_many_tags_all': f'{many_tags}&tags_mode=all',
+            '_favorited': 'is_favorited=1',
+            '_in_shopping_cart': 'is_in_shopping_cart=1',
+            '_search': f'search={self.recipe.name.split()[0]}',
+            '_cursor': 'cursor=',
+        }
+        scenarios = []
+        for suffix, query in filters.items():
+            url = f'/api/recipes/?{query}'
+            if suffix not in ('_favorited', '_in_shopping_cart'):
+                scenarios += [
+                    (f'recipe_list_anonymous{suffix}',
+                     lambda url=url: anonymous.get(url), cache.clear),
+                    (f'recipe_list_anonymous_cached{suffix}',
+                     lambda url=url: anonymous.get(url), None),
+                ]
+            scenarios.append((
+                f'recipe_list_authenticated{suffix}',
+                lambda url=url: client.get(url), None))
+
+        detail_url = f'/api/recipes/{recipe_id}/'
+        scenarios += [
+            ('recipe_detail_anonymous',
+             lambda: anonymous.get(detail_url), cache.clear),
+            ('recipe_detail_authenticated',
+             lambda: client.get(detail_url), None),
+            ('recipe_create',
+             lambda: client.post(
+                 '/api/recipes/', self.get_recipe_data(1), format='json'),
+             None),
+        ]
+        amounts = count(1)
+        scenarios.append((
+            'recipe_update',
+            lambda: client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                self.get_recipe_data(next(amounts) % 100 + 1),
+                format='json'),
+            None))
+
+        for name, model in (('favorite', Favorite),
+                            ('shopping_cart', ShoppingList)):
+            url = f'/api/recipes/{recipe_id}/{name}/'
+            remove = self.make_setup(model, exists=False)
+            add = self.make_setup(model, exists=True)
+            scenarios += [
+                (f'{name}_add', lambda url=url: client.post(url), remove),
+                (f'{name}_remove',
+                 lambda url=url: client.delete(url), add),
+            ]
+        favorite_url = f'/api/recipes/{recipe_id}/favorite/'
+        scenarios += [
+            ('favorite_add_asgi',
+             lambda: call_async(async_client.post, favorite_url, headers),
+             self.make_setup(Favorite, exists=False)),
+            ('favorite_remove_asgi',
+             lambda: call_async(async_client.delete, favorite_url, headers),
+             self.make_setup(Favorite, exists=True)),
+            ('user_me', lambda: client.get('/api/users/me/'), None),
+            ('user_me_token_miss',
+             lambda: client.get('/api/users/me/'),
+             lambda: forget_token(self.token.key)),
+            ('subscriptions',
+             lambda: client.get('/api/users/subscriptions/?recipes_limit=3'),
+             None),
+            ('ingredient_search',
+             lambda: anonymous.get('/api/ingredients/?name=мол'), None),
+        ]
+        for renderer in ('txt', 'csv', 'json'):
+            url = f'/api/recipes/download_shopping_cart/?format={renderer}'
+            scenarios.append((
+                f'download_shopping_cart_{renderer}',
+                lambda url=url: client.get(url), None))
+        return scenarios
+
+    def get_recipe_data(self, amount):
+        return {
+            'name': 'Рецепт для замеров',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [tag.id for tag in Tag.objects.filter(
+                slug__in=self.tag_slugs)],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount if index == 0 else 1}
+                for index, ingredient in enumerate(self.ingredients)
+            ],
+        }
+
+    def make_setup(self, model, exists):
+        def setup():
+            relation = model.objects.filter(
+                user=self.user, recipe=self.other_recipe)
+            if exists and not relation.exists():
+                model.objects.create(user=self.user, recipe=self.other_recipe)
+            elif not exists:
+                relation.delete()
+        return setup
+
+    def run_scenarios(self, options):
+        results = {}
+        for name, request, setup in self.get_scenarios():
+            if options['scenario'] and not any(
+                    name.startswith(prefix) for prefix in options['scenario']):
+                continue
+            results[name] = self.measure(request, setup, options)
+            if name.endswith('_asgi'):
+                # ASGI requests query from their own threads and connections.
+                results[name]['queries'] = None
+            latency = results[name]['latency_ms']
+            self.stdout.write(
+                f'{name}: p50 {latency["p50"]} мс, '
+                f'запросов {results[name]["queries"]}')
+            if results[name]['status'] >= 400:
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: ответ {results[name]["status"]}, '
+                    f'замер не отражает рабочий сценарий.'))
+        for name, run in (('favorite_load_wsgi', self.run_load_wsgi),
+                          ('favorite_load_asgi', self.run_load_asgi)):
+            if options['scenario'] and not any(
+                    name.startswith(prefix) for prefix in options['scenario']):
+                continue
+            if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: пропущен, база SQLite в памяти блокирует '
+                    f'таблицы при параллельной записи.'))
+                continue
+            results[name] = self.measure_load(run, options)
+            self.stdout.write(
+                f'{name}: {results[name]["rps"]} запросов/с, '
+                f'p50 {results[name]["latency_ms"]["p50"]} мс, '
+                f'ответы {results[name]["statuses"]}')
+        return results
+
+    def get_load_urls(self):
+        return [f'/api/recipes/{recipe.id}/favorite/'
+                for recipe in self.load_recipes]
+
+    def run_load_wsgi(self, per_client):
+        """Toggles from parallel threads through the WSGI handler."""
+        def worker(url):
+            client = APIClient(raise_request_exception=False)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            calls = []
+            try:
+                for index in range(per_client):
+                    request = client.delete if index % 2 else client.post
+                    started = time.perf_counter()
+                    response = request(url)
+                    calls.append((time.perf_counter() - started,
+                                  response.status_code))
+            finally:
+                connections.close_all()
+            return calls
+
+        urls = self.get_load_urls()
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            return [call for calls in pool.map(worker, urls)
+                    for call in calls]
+
+    def run_load_asgi(self, per_client):
+        """Toggles from parallel tasks through the ASGI handler."""
+        client = AsyncClient(raise_request_exception=False)
+        headers = {'Authorization': f'Token {self.token.key}'}
+
+        async def worker(url):
+            calls = []
+            for index in range(per_client):
+                request = client.delete if index % 2 else client.post
+                started = time.perf_counter()
+                response = await request(url, headers=headers)
+                calls.append((time.perf_counter() - started,
+                              response.status_code))
+            return calls
+
+        async def run():
+            return await asyncio.gather(
+                *(worker(url) for url in self.get_load_urls()))
+        return [call for calls in async_to_sync(run)() for call in calls]
+
+    def measure_load(self, run, options):
+        """Requests per second of parallel clients adding and removing.
+
+        Every client owns one recipe and makes an even number of
+        requests, so favorites end where they started.
+        """
+        clients = len(self.load_recipes)
+        if not clients:
+            raise CommandError('Нет рецептов для нагрузочных сценариев.')
+        per_client = max(options['load_requests'] // clients // 2 * 2, 2)
+        run(2)
+        started = time.perf_counter()
+        calls = run(per_client)
+        elapsed = time.perf_counter() - started
+        return {
+            'concurrency': clients,
+            'requests': len(calls),
+            'rps': round(len(calls) / elapsed, 1),
+            'statuses': {str(status): number for status, number
+                         in sorted(Counter(
+                             status for _, status in calls).items())},
+            'queries': None,
+            'latency_ms': summarize(
+                [duration * 1000 for duration, _ in calls]),
+        }
+
+    def measure(self, request, setup, options):
+        for _ in range(options['warmup']):
+            if setup:
+                setup()
+            consume(request())
+
+        timings = []
+        queries = []
+        for _ in range(options['iterations']):
+            if setup:
+                setup()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request()
+                consume(response)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+
+        if setup:
+            setup()
+        tracemalloc.start()
+        consume(request())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            'status': response.status_code,
+            'queries': max(queries),
+            'latency_ms': summarize(timings),
+            'memory_peak_kib': round(peak / 1024, 1),
+        }
+
+    def compare(self, previous, report, threshold):
+        """Print changes against previous results, fail on regressions."""
+        if previous.get('dataset') != report['dataset']:
+            self.stdout.write(self.style.WARNING(
+                'Наборы данных различаются, сравнение может быть неточным.'))
+        regressions = []
+        for name, result in report['scenarios'].items():
+            old = previous.get('scenarios', {}).get(name)
+            if old is None:
+                continue
+            old_p50 = old['latency_ms']['p50']
+            new_p50 = result['latency_ms']['p50']
+            change = (new_p50 - old_p50) / old_p50 * 100 if old_p50 else 0
+            line = (f'{name}: p50 {old_p50} -> {new_p50} мс '
+                    f'({change:+.1f}%), запросов '
+                    f'{old["queries"]} -> {result["queries"]}')
+            more_queries = (result['queries'] or 0) > (old['queries'] or 0)
+            if 'rps' in result and old.get('rps'):
+                rps_change = (result['rps'] - old['rps']) / old['rps'] * 100
+                line += (f', {old["rps"]} -> {result["rps"]} запросов/с '
+                         f'({rps_change:+.1f}%)')
+                change = max(change, -rps_change)
+            if change > threshold or more_queries:
+                regressions.append(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions))
@@ -0,0 +1,206 @@
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodgram_backend import constants, routers
+from foodgram_backend.versions import get_version
+
+
+class VersionedBodyCache:
+    """Bounded LRU of serialized bodies keyed by data version."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+
+class CacheCounters:
+    """Per-process counters added to the shared cache in batches.
+
+    Requests only touch the shared cache once per flush_every counts,
+    totals lag behind by the counts other processes did not flush yet.
+    """
+    def __init__(self, flush_every):
+        self.flush_every = flush_every
+        self.pending = Counter()
+        self.lock = threading.Lock()
+
+    def incr(self, key):
+        with self.lock:
+            self.pending[key] += 1
+            if self.pending[key] < self.flush_every:
+                return
+            delta = self.pending.pop(key)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+    def get(self, key):
+        with self.lock:
+            pending = self.pending[key]
+        return cache.get(key, 0) + pending
+
+
+catalog_cache = VersionedBodyCache(constants.CATALOG_CACHE_SIZE)
+page_cache_counters = CacheCounters(constants.PAGE_CACHE_STATS_FLUSH)
+
+
+class ReplicaReadsMixin:
+    """Viewsets and actions may keep their reads on the primary.
+
+    Set read_from_replica = False on the class or pass it to @action.
+    """
+    read_from_replica = True
+
+    def initial(self, request, *args, **kwargs):
+        # Before authentication, so that every read of the view follows.
+        if not self.read_from_replica:
+            routers.pin_primary()
+        super().initial(request, *args, **kwargs)
+
+
+class SerializationTimingMixin:
+    """Mark serializer work for RequestProfilingMiddleware.
+
+    The window opens with the first serializer of the view and closes
+    when the response is finalized: validation, saving and representation,
+    without the lookups and pagination before them.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        marks = getattr(self.request, 'profiling_marks', None)
+        if marks is not None:
+            marks.setdefault('serialize', time.perf_counter())
+        return super().get_serializer(*args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        marks = getattr(request, 'profiling_marks', None)
+        if marks is not None and 'serialize' in marks:
+            marks.setdefault('serialized', time.perf_counter())
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class CatalogCacheMixin:
+    """Conditional GET and in-memory body cache for reference data."""
+    # Public data that does not depend on the user: skipping
+    # authentication keeps 304 responses free of token lookups.
+    authentication_classes = ()
+    catalog_version_key = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_catalog_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_catalog_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_catalog_response(self, handler, request, *args, **kwargs):
+        version = get_version(self.catalog_version_key)
+        renderer_format = request.accepted_renderer.format
+        etag = f'"{self.catalog_version_key}-{version}-{renderer_format}"'
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = (self.catalog_version_key, version,
+                   renderer_format, request.get_full_path())
+            data = catalog_cache.get(key)
+            if data is None:
+                # A lagging replica would store old rows under the new
+                # version until the next change.
+                routers.pin_primary()
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                catalog_cache.set(key, response.data)
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=constants.CATALOG_MAX_AGE)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class AnonymousCacheMixin:
+    """Shared response cache for anonymous list and retrieve requests."""
+    page_cache_version_key = None
+    page_cache_timeout = constants.PAGE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_page_cache_key(self, request):
+        version = get_version(self.page_cache_version_key)
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        raw = repr((request.get_host(), request.path,
+                    request.accepted_renderer.format, params))
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return f'{self.page_cache_version_key}:{version}:{digest}'
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key = self.get_page_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            self.count_page_cache('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        self.count_page_cache('misses')
+        # The page is stored under the current version, read it from
+        # the primary where that version was committed.
+        routers.pin_primary()
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.page_cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def count_page_cache(self, name):
+        page_cache_counters.incr(f'{self.page_cache_version_key}:{name}')
+
+    def get_page_cache_stats(self):
+        """Approximate totals, see CacheCounters."""
+        prefix = self.page_cache_version_key
+        return {
+            'version': get_version(prefix),
+            'hits': page_cache_counters.get(f'{prefix}:hits'),
+            'misses': page_cache_counters.get(f'{prefix}:misses'),
+        }
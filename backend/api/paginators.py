@@ -1,7 +1,141 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram_backend import constants
 
 
 class RecipePagination(PageNumberPagination):
+    """Page number pagination with opt-in keyset mode.
+
+    Passing the cursor query param (empty for the first page) switches
+    to keyset pagination over cursor_ordering: no COUNT and no OFFSET,
+    so the cost of a page does not depend on its depth. Params ordering
+    by relevance are rejected with a cursor, keyset order would drop it.
+    """
     page_query_param = 'page'
     page_size_query_param = 'limit'
     page_size = 6
+    max_page_size = constants.MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('name', 'id')
+    invalid_cursor_message = 'Неверный курсор.'
+    cursor_conflicting_params = ('search',)
+    cursor_conflict_message = 'Курсор нельзя использовать вместе с поиском.'
+    use_cursor = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        if any(request.query_params.get(param)
+               for param in self.cursor_conflicting_params):
+            raise ValidationError(
+                {self.cursor_query_param: self.cursor_conflict_message})
+
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.page_query_param)
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self.clean_position(queryset.model, position)
+
+        ordering = self.cursor_ordering
+        if reverse:
+            ordering = tuple(f'-{field}' for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(position, reverse))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def get_keyset_filter(self, position, reverse):
+        lookup = 'lt' if reverse else 'gt'
+        query = Q()
+        for index, field in enumerate(self.cursor_ordering):
+            equal = dict(zip(self.cursor_ordering[:index], position[:index]))
+            query |= Q(**equal, **{f'{field}__{lookup}': position[index]})
+        return query
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = payload['p'], bool(payload['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.cursor_ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def clean_position(self, model, position):
+        """Cursor values converted to their fields, NotFound if invalid."""
+        cleaned = []
+        for field, value in zip(self.cursor_ordering, position):
+            if value is None or isinstance(value, (list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(model._meta.get_field(field).to_python(value))
+            except DjangoValidationError:
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, instance, reverse):
+        payload = json.dumps({
+            'p': [getattr(instance, field) for field in self.cursor_ordering],
+            'r': int(reverse),
+        })
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class SubscribePagination(RecipePagination):
+    cursor_ordering = ('username', 'id')
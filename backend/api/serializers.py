@@ -1,19 +1,38 @@
 from rest_framework import serializers
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 
+from recipes.images import get_variant_urls
 from recipes.models import (Recipe, RecipeTag, RecipeIngredient,
                             Tag, Favorite, User, ShoppingList)
 from ingredients.models import Ingredient
 from users.serializers import UserSerializer
 from foodgram_backend import constants
+from .utils import delete_relations, get_recipes_limit
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Urls of resized and WebP versions of recipe image."""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        urls = get_variant_urls(value)
+        request = self.context.get('request')
+        if request is None:
+            return urls
+        return {variant: request.build_absolute_uri(url)
+                for variant, url in urls.items()}
 
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
     """Recipe serializer for adding to favorite."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -29,7 +48,7 @@ class RecipeIngredientListSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=constants.MIN_INT_VALIDATOR,
         max_value=constants.MAX_AMOUNT_VALIDATOR
@@ -63,7 +82,8 @@ class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=False)
     ingredients = RecipeIngredientSerializer(required=True, many=True)
     author = UserSerializer(read_only=True)
-    tags = serializers.ListField(required=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=True)
     cooking_time = serializers.IntegerField(
         min_value=constants.MIN_INT_VALIDATOR,
         max_value=constants.MAX_TIME_VALIDATOR
@@ -80,6 +100,7 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'cooking_time')
 
     def to_representation(self, instance):
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return RecipeListSerializer(
             instance, context={'request': self.context.get('request')}).data
 
@@ -95,22 +116,22 @@ class RecipeSerializer(serializers.ModelSerializer):
         if not (ingredients and tags):
             raise serializers.ValidationError()
 
-        checklist = []
-        for ingredient in ingredients:
-            if ingredient.get('id') in checklist:
-                raise serializers.ValidationError()
-            checklist.append(ingredient.get('id'))
-
-        checklist = []
-        for tag in tags:
-            if tag in checklist:
-                raise serializers.ValidationError()
-            if not Tag.objects.filter(id=tag).exists():
-                raise serializers.ValidationError()
-            checklist.append(tag)
+        ingredient_ids = [ingredient.get('id') for ingredient in ingredients]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError()
+        if Ingredient.objects.filter(
+                id__in=ingredient_ids).count() != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Указан несуществующий ингредиент.')
+
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError()
+        if Tag.objects.filter(id__in=tags).count() != len(tags):
+            raise serializers.ValidationError()
 
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         image = self.initial_data.get('image')
         if not (isinstance(image, str) and image.startswith('data:image')):
@@ -121,18 +142,15 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         recipe = Recipe.objects.create(**validated_data)
 
-        recipe_tag = []
-        for tag in tags:
-            current_tag = get_object_or_404(Tag, id=tag)
-            recipe_tag.append(RecipeTag(recipe=recipe, tag=current_tag))
-        RecipeTag.objects.bulk_create(recipe_tag)
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag) for tag in tags)
 
         recipe_ingredients = []
         for ingredient in ingredients:
             recipe_ingredients.append(
                 RecipeIngredient(
                     recipe=recipe,
-                    ingredient=ingredient.get('id'),
+                    ingredient_id=ingredient.get('id'),
                     amount=ingredient.get('amount')
                 )
             )
@@ -140,6 +158,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
@@ -148,30 +167,55 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         instance.image = validated_data.get('image', instance.image)
 
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        recipe_tag = []
-        for tag in tags:
-            current_tag = get_object_or_404(Tag, id=tag)
-            recipe_tag.append(RecipeTag(recipe=instance, tag=current_tag))
-        RecipeTag.objects.bulk_create(recipe_tag)
-
-        ingredients = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        recipe_ingredients = []
-        for ingredient in ingredients:
-            recipe_ingredients.append(
-                RecipeIngredient(
-                    recipe=instance,
-                    ingredient=ingredient.get('id'),
-                    amount=ingredient.get('amount')
-                )
-            )
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        self.update_tags(instance, validated_data.pop('tags'))
+        self.update_ingredients(instance, validated_data.pop('ingredients'))
 
+        # Saving the recipe refreshes its search vector and page cache
+        # once, so bulk changes of the through rows skip per-row signals.
         instance.save()
         return instance
 
+    def update_tags(self, instance, tags):
+        """Apply only added and removed tags."""
+        tags = set(tags)
+        current = set(RecipeTag.objects.filter(
+            recipe=instance).order_by().values_list('tag_id', flat=True))
+        removed = current - tags
+        if removed:
+            delete_relations(
+                RecipeTag, instance.pk, removed, owner='recipe', target='tag')
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=instance, tag_id=tag) for tag in tags - current)
+
+    def update_ingredients(self, instance, ingredients):
+        """Apply only added, removed and changed ingredient amounts."""
+        amounts = {ingredient['id']: ingredient['amount']
+                   for ingredient in ingredients}
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=instance).order_by()
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            delete_relations(
+                RecipeIngredient, instance.pk, removed,
+                owner='recipe', target='ingredient')
+
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+
 
 class RecipeListSerializer(serializers.ModelSerializer):
     """Serializer for list Recipes model."""
@@ -181,6 +225,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
     tags = RecipeTagListSerializer(required=True, many=True, source='r_tags')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -190,30 +235,43 @@ class RecipeListSerializer(serializers.ModelSerializer):
                   'ingredients',
                   'is_favorited',
                   'is_in_shopping_cart',
+                  'favorites_count',
                   'name',
                   'image',
+                  'image_variants',
                   'text',
                   'cooking_time')
 
-    def get_is_favorited(self, obj):
+    def get_user_relation(self, obj, annotation, model):
+        """Read annotated flag, query only for unannotated instances."""
         user = self.context['request'].user
-        return user.is_authenticated and Favorite.objects.filter(
-            user=user,
-            recipe=obj
-        ).exists()
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
+        return model.objects.filter(user=user, recipe=obj).exists()
+
+    def get_is_favorited(self, obj):
+        return self.get_user_relation(obj, 'is_favorited', Favorite)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return user.is_authenticated and ShoppingList.objects.filter(
-            user=user,
-            recipe=obj
-        ).exists()
+        return self.get_user_relation(
+            obj, 'is_in_shopping_cart', ShoppingList)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """List of recipe ids for batch requests."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=constants.MIN_INT_VALIDATOR),
+        allow_empty=False,
+        max_length=constants.MAX_BATCH_SIZE
+    )
 
 
 class SubscribeSerializer(UserSerializer):
     """Subscribe serializer."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -229,17 +287,9 @@ class SubscribeSerializer(UserSerializer):
         )
 
     def get_recipes(self, obj):
-        recipes_limit = self.context[
-            'request'
-        ].query_params.get('recipes_limit', 'f')
-
-        if not recipes_limit.isdigit():
-            recipes_limit = None
+        if hasattr(obj, 'recipes_preview'):
+            data = obj.recipes_preview
         else:
-            recipes_limit = int(recipes_limit)
-
-        data = obj.recipes.all()[:recipes_limit]
+            recipes_limit = get_recipes_limit(self.context['request'])
+            data = obj.recipes.all()[:recipes_limit]
         return FavoriteRecipeSerializer(instance=data, many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
@@ -0,0 +1,71 @@
+import json
+import warnings
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes.models import Recipe, RecipeIngredient, ShoppingList
+from users.models import User
+
+URL = '/api/recipes/download_shopping_cart/'
+ROWS = [(f'Ингредиент {index}', 3, 'г') for index in range(3)]
+EXPECTED = {
+    'txt': 'Ваш список покупок, Имя!\n' + ''.join(
+        f'{name}: {amount} {unit}\n' for name, amount, unit in ROWS),
+    'csv': 'Продукт,Количество,Единицы измерения\r\n' + ''.join(
+        f'{name},{amount},{unit}\r\n' for name, amount, unit in ROWS),
+    'json': '[' + ','.join(
+        json.dumps({'name': name, 'amount': amount, 'measurement_unit': unit},
+                   ensure_ascii=False)
+        for name, amount, unit in ROWS) + ']',
+}
+
+
+class ShoppingCartDownloadTest(TestCase):
+    """Both entry points stream the file, ASGI without buffering it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя')
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for name, _, unit in ROWS
+        )
+        for amount in (1, 2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {amount}', text='Описание',
+                cooking_time=10, image='')
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=amount)
+                for ingredient in ingredients
+            )
+            ShoppingList.objects.create(user=cls.user, recipe=recipe)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def test_wsgi(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        for file_format, expected in EXPECTED.items():
+            response = client.get(URL, {'format': file_format})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.is_async)
+            body = b''.join(response.streaming_content)
+            self.assertEqual(body.decode(), expected)
+
+    async def test_asgi(self):
+        headers = {'Authorization': f'Token {self.token}'}
+        for file_format, expected in EXPECTED.items():
+            response = await self.async_client.get(
+                URL, {'format': file_format}, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            # Django warns when it has to collect a sync iterator first.
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                body = b''.join([chunk async for chunk in response])
+            self.assertEqual(body.decode(), expected)
@@ -0,0 +1,35 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from recipes.models import Recipe
+from users.models import User
+
+
+@mock.patch('recipes.signals.schedule_variants')
+class ImageVariantsScheduleTest(TestCase):
+    """Variants are scheduled only for images without them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=10,
+            image='recipes/images/ready.jpg',
+            variants_image='recipes/images/ready.jpg')
+
+    def save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.save()
+
+    def test_ready_image(self, schedule_variants):
+        self.recipe.name = 'Новое название'
+        self.save()
+        schedule_variants.assert_not_called()
+
+    def test_new_image(self, schedule_variants):
+        self.recipe.image = 'recipes/images/new.jpg'
+        self.save()
+        schedule_variants.assert_called_once_with('recipes/images/new.jpg')
@@ -0,0 +1,31 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from api.mixins import CacheCounters
+
+KEY = 'recipes_version:hits'
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'page-cache-counters',
+}})
+class CacheCountersTest(SimpleTestCase):
+    """Page cache counters reach the shared cache once per batch."""
+
+    def setUp(self):
+        cache.clear()
+        self.counters = CacheCounters(flush_every=3)
+
+    def test_counts_stay_in_process_until_flush(self):
+        for _ in range(2):
+            self.counters.incr(KEY)
+        self.assertIsNone(cache.get(KEY))
+        self.assertEqual(self.counters.get(KEY), 2)
+
+    def test_flush_adds_batch_to_shared_total(self):
+        cache.set(KEY, 10, None)
+        for _ in range(4):
+            self.counters.incr(KEY)
+        self.assertEqual(cache.get(KEY), 13)
+        self.assertEqual(self.counters.get(KEY), 14)
@@ -0,0 +1,92 @@
+import base64
+import json
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+
+PAGE_SIZE = 2
+
+
+def encode(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class CursorPaginationTest(TestCase):
+    """Keyset pages walk the whole list both ways, bad cursors are 404."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        # Repeated names check that id breaks ties between pages.
+        Recipe.objects.bulk_create(
+            Recipe(author=cls.author, name=f'Рецепт {index // 2}',
+                   text='Описание', cooking_time=10, image='')
+            for index in range(7)
+        )
+        cls.ids = list(Recipe.objects.order_by(
+            'name', 'id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_forward_walk(self):
+        pages = self.walk(f'/api/recipes/?cursor=&limit={PAGE_SIZE}', 'next')
+        self.assertEqual(sum(pages, []), self.ids)
+        self.assertTrue(all(len(page) <= PAGE_SIZE for page in pages))
+
+    def test_backward_walk(self):
+        last = self.walk(
+            f'/api/recipes/?cursor=&limit={PAGE_SIZE}', 'next')[-1]
+        response = self.client.get(
+            f'/api/recipes/?cursor=&limit={PAGE_SIZE}')
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+        self.assertIsNone(response.data['next'])
+        pages = self.walk(response.data['previous'], 'previous')
+        self.assertEqual(sum(reversed(pages), []) + last, self.ids)
+
+    def test_subscriptions_walk(self):
+        for author in User.objects.bulk_create(
+                User(username=f'user{index}', email=f'user{index}@e.com')
+                for index in range(5)):
+            author.followers.create(follower=self.author)
+        pages = self.walk(
+            f'/api/users/subscriptions/?cursor=&limit={PAGE_SIZE}', 'next')
+        self.assertEqual(sum(pages, []), list(
+            User.objects.filter(followers__follower=self.author).order_by(
+                'username', 'id').values_list('id', flat=True)))
+
+    def test_invalid_cursors(self):
+        for cursor in (
+                'not-base64!',
+                encode([]),
+                encode({'p': ['Рецепт 0', 1]}),
+                encode({'p': ['Рецепт 0'], 'r': 0}),
+                encode({'p': 'Рецепт 0', 'r': 0}),
+                encode({'p': ['a', 'x'], 'r': 0}),
+                encode({'p': [None, 1], 'r': 0}),
+                encode({'p': ['a', None], 'r': 1}),
+                encode({'p': [['a'], 1], 'r': 0}),
+                encode({'p': ['a', {'id': 1}], 'r': 0})):
+            response = self.client.get(f'/api/recipes/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_search_with_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=&search=Рецепт')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
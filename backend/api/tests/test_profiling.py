@@ -0,0 +1,121 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (AsyncClient, RequestFactory, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram_backend.middleware import (RequestProfilingMiddleware,
+                                         install_query_counters)
+from recipes.models import Recipe
+from users.models import User
+
+URL = '/api/recipes/'
+
+
+class RequestProfilingTest(TestCase):
+    """Timing headers are added only when REQUEST_PROFILING is on."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password')
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Описание',
+            cooking_time=10, image='')
+        cls.favorite_url = f'/api/recipes/{recipe.id}/favorite/'
+        cls.token = Token.objects.create(user=cls.user)
+
+    def get_client(self):
+        # Middleware is loaded with the first request of a client, so
+        # it has to be created once the settings are overridden.
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+    def get_timings(self, response):
+        return dict(
+            entry.split(';dur=')
+            for entry in response['Server-Timing'].split(', '))
+
+    @override_settings(REQUEST_PROFILING=True)
+    def test_enabled(self):
+        client = self.get_client()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-DB-Queries'], str(len(context)))
+        timings = self.get_timings(response)
+        self.assertEqual(
+            list(timings), ['db', 'view', 'serialize', 'render', 'total'])
+        durations = {name: float(value) for name, value in timings.items()}
+        self.assertTrue(all(value >= 0 for value in durations.values()))
+        self.assertLessEqual(durations['serialize'], durations['view'])
+
+    @override_settings(REQUEST_PROFILING=True)
+    def test_view_without_serializer_timing(self):
+        response = self.get_client().delete(self.favorite_url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            list(self.get_timings(response)),
+            ['db', 'view', 'render', 'total'])
+
+    @override_settings(REQUEST_PROFILING=True,
+                       REQUEST_PROFILING_MAX_QUERIES=0)
+    def test_logs_heavy_requests(self):
+        client = self.get_client()
+        with self.assertLogs('foodgram_backend.middleware', 'WARNING') as logs:
+            client.get(URL)
+        self.assertIn(f'GET {URL}', logs.output[0])
+
+    @override_settings(REQUEST_PROFILING=True)
+    async def test_asgi(self):
+        # The test client sends request_started from another thread than
+        # the one the views query from, unlike the ASGI handler.
+        await sync_to_async(install_query_counters)()
+        client = AsyncClient()
+        headers = {'Authorization': f'Token {self.token}'}
+        for response in (
+                await client.get(URL, headers=headers),
+                await client.delete(self.favorite_url, headers=headers)):
+            self.assertIn('Server-Timing', response)
+            self.assertGreater(int(response['X-DB-Queries']), 0)
+
+    @override_settings(REQUEST_PROFILING=True)
+    def test_asgi_chain_stays_async(self):
+        handler = ASGIHandler()
+        handler.load_middleware(is_async=True)
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
+
+    @override_settings(REQUEST_PROFILING=True)
+    def test_counts_queries_of_worker_threads(self):
+        def query():
+            try:
+                with connections['default'].cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            finally:
+                connections['default'].close()
+
+        def get_response(request):
+            # Async views query the same way, in a thread with a copy of
+            # the request context.
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                pool.submit(contextvars.copy_context().run, query).result()
+            return HttpResponse()
+
+        response = RequestProfilingMiddleware(get_response)(
+            RequestFactory().get('/'))
+        self.assertEqual(response['X-DB-Queries'], '1')
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_disabled(self):
+        response = self.get_client().get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('X-DB-Queries', response)
@@ -0,0 +1,255 @@
+import base64
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.views import (FavoriteViewSet, RecipeViewSet, ShoppingListViewSet,
+                       SubscribeListViewSet, SubscribeViewSet)
+from ingredients.models import Ingredient
+from ingredients.views import IngredientViewSet
+from recipes.models import (Favorite, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingList, Tag)
+from recipes.views import TagViewSet
+from users.models import Subscription, User
+from users.views import UserViewSet
+
+IMAGE = 'data:image/gif;base64,' + base64.b64encode(
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9'
+    b'\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00'
+    b'\x02\x02D\x01\x00;'
+).decode()
+
+
+class QueryBudgetMixin:
+    """Every route stays within the query_budget of its view.
+
+    Subclasses run the same requests on datasets of different size, so
+    a budget holds only if queries do not grow with rows.
+    """
+    authors = 0
+    recipes_per_author = 0
+    tags_per_recipe = 0
+    ingredients_per_recipe = 0
+
+    @classmethod
+    def setUpClass(cls):
+        # Uploaded images go to a throwaway directory. Their variants are
+        # scheduled on commit, which never happens inside a TestCase.
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        cls.addClassCleanup(media_override.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password')
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', color='#FF0000', slug=f'tag{index}')
+            for index in range(cls.tags_per_recipe)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(cls.ingredients_per_recipe)
+        )
+        authors = User.objects.bulk_create(
+            User(username=f'author{index}',
+                 email=f'author{index}@example.com')
+            for index in range(cls.authors)
+        )
+        cls.author = authors[0]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {index}', text='Описание',
+                   cooking_time=10, image='')
+            for author in authors
+            for index in range(cls.recipes_per_author)
+        )
+        cls.recipe = recipes[0]
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in cls.tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes for ingredient in cls.ingredients
+        )
+        for model in (Favorite, ShoppingList):
+            model.objects.bulk_create(
+                model(user=cls.user, recipe=recipe) for recipe in recipes[1:])
+        Subscription.objects.bulk_create(
+            Subscription(follower=cls.user, author=author)
+            for author in authors[1:]
+        )
+        cls.own_recipe = Recipe.objects.create(
+            author=cls.user, name='Свой рецепт', text='Описание',
+            cooking_time=10, image='')
+        cls.page_size = len(recipes)
+        cls.recipe_ids = [recipe.id for recipe in recipes]
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}')
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+
+    def assert_budget(self, view, action, request):
+        budget = view.query_budget[action]
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, response)
+        queries = '\n'.join(query['sql'] for query in context)
+        self.assertLessEqual(
+            len(context), budget,
+            f'{view.__name__}.{action}: {len(context)} queries, '
+            f'budget {budget}\n{queries}')
+
+    def get_recipe_data(self):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [{'id': ingredient.id, 'amount': 2}
+                            for ingredient in self.ingredients],
+        }
+
+    def test_recipes_read(self):
+        limit = f'limit={self.page_size}'
+        tags = '&'.join(f'tags={tag.slug}' for tag in self.tags)
+        for client in (self.anonymous, self.client):
+            for query in ('', f'author={self.author.id}', tags,
+                          f'{tags}&tags_mode=all', 'is_favorited=1',
+                          'is_in_shopping_cart=1', 'search=Рецепт',
+                          'cursor='):
+                url = f'/api/recipes/?{limit}&{query}'
+                self.assert_budget(
+                    RecipeViewSet, 'list', lambda: client.get(url))
+            self.assert_budget(
+                RecipeViewSet, 'retrieve',
+                lambda: client.get(f'/api/recipes/{self.recipe.id}/'))
+        for renderer in ('txt', 'csv', 'json'):
+            self.assert_budget(
+                RecipeViewSet, 'download_shopping_cart',
+                lambda: self.client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    {'format': renderer}))
+        self.assert_budget(
+            RecipeViewSet, 'cache_stats',
+            lambda: self.admin_client.get('/api/recipes/cache_stats/'))
+
+    def test_recipes_write(self):
+        self.assert_budget(
+            RecipeViewSet, 'create',
+            lambda: self.client.post(
+                '/api/recipes/', self.get_recipe_data(), format='json'))
+        url = f'/api/recipes/{self.own_recipe.id}/'
+        self.assert_budget(
+            RecipeViewSet, 'partial_update',
+            lambda: self.client.patch(
+                url, self.get_recipe_data(), format='json'))
+        self.assert_budget(
+            RecipeViewSet, 'update',
+            lambda: self.client.put(
+                url, self.get_recipe_data(), format='json'))
+        data = self.get_recipe_data()
+        data['tags'] = data['tags'][:1]
+        data['ingredients'] = data['ingredients'][:1]
+        self.assert_budget(
+            RecipeViewSet, 'update',
+            lambda: self.client.put(url, data, format='json'))
+        self.assert_budget(
+            RecipeViewSet, 'destroy', lambda: self.client.delete(url))
+
+    def test_batches(self):
+        data = {'recipes': self.recipe_ids}
+        for action, url in (
+                ('favorite_batch', '/api/recipes/favorite/'),
+                ('shopping_cart_batch', '/api/recipes/shopping_cart/')):
+            for method in ('delete', 'post'):
+                self.assert_budget(
+                    RecipeViewSet, action,
+                    lambda: getattr(self.client, method)(
+                        url, data, format='json'))
+
+    def test_toggles(self):
+        for view, url in (
+                (FavoriteViewSet, f'/api/recipes/{self.recipe.id}/favorite/'),
+                (ShoppingListViewSet,
+                 f'/api/recipes/{self.recipe.id}/shopping_cart/'),
+                (SubscribeViewSet, f'/api/users/{self.admin.id}/subscribe/')):
+            self.assert_budget(view, 'create', lambda: self.client.post(url))
+            self.assert_budget(view, 'delete', lambda: self.client.delete(url))
+
+    def test_subscriptions(self):
+        for query in ('', 'recipes_limit=2', 'cursor='):
+            self.assert_budget(
+                SubscribeListViewSet, 'list',
+                lambda: self.client.get(
+                    f'/api/users/subscriptions/?limit={self.page_size}'
+                    f'&{query}'))
+
+    def test_catalogs(self):
+        for view, url, item in (
+                (TagViewSet, '/api/tags/', self.tags[0].id),
+                (IngredientViewSet, '/api/ingredients/',
+                 self.ingredients[0].id)):
+            self.assert_budget(view, 'list', lambda: self.anonymous.get(url))
+            self.assert_budget(
+                view, 'retrieve', lambda: self.anonymous.get(f'{url}{item}/'))
+        self.assert_budget(
+            IngredientViewSet, 'list',
+            lambda: self.anonymous.get('/api/ingredients/?name=Ингр'))
+
+    def test_users(self):
+        for client in (self.anonymous, self.client):
+            self.assert_budget(
+                UserViewSet, 'list',
+                lambda: client.get(f'/api/users/?limit={self.page_size}'))
+            self.assert_budget(
+                UserViewSet, 'retrieve',
+                lambda: client.get(f'/api/users/{self.author.id}/'))
+        self.assert_budget(
+            UserViewSet, 'me', lambda: self.client.get('/api/users/me/'))
+        self.assert_budget(
+            UserViewSet, 'create',
+            lambda: self.anonymous.post('/api/users/', {
+                'email': 'new@example.com', 'username': 'new',
+                'first_name': 'Имя', 'last_name': 'Фамилия',
+                'password': 'Sup3r-secret-pass',
+            }))
+        self.assert_budget(
+            UserViewSet, 'set_password',
+            lambda: self.client.post('/api/users/set_password/', {
+                'current_password': 'password',
+                'new_password': 'Sup3r-secret-pass',
+            }))
+
+
+class SmallDatasetQueryBudgetTest(QueryBudgetMixin, TestCase):
+    authors = 2
+    recipes_per_author = 1
+    tags_per_recipe = 1
+    ingredients_per_recipe = 1
+
+
+class LargeDatasetQueryBudgetTest(QueryBudgetMixin, TestCase):
+    authors = 10
+    recipes_per_author = 4
+    tags_per_recipe = 5
+    ingredients_per_recipe = 12
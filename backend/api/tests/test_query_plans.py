@@ -0,0 +1,189 @@
+import json
+import re
+from itertools import combinations
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes.models import (Favorite, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingList, Tag)
+from users.models import Subscription, User
+
+USERS = 200
+RECIPES = 2000
+TAGS = 40
+INDEX_SCANS = frozenset(
+    ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'))
+# Filter: (table it narrows, filtered column).
+FILTERS = {
+    'author': (Recipe._meta.db_table, 'author_id'),
+    'tags': (RecipeTag._meta.db_table, 'tag_id'),
+    'is_favorited': (Favorite._meta.db_table, 'user_id'),
+    'is_in_shopping_cart': (ShoppingList._meta.db_table, 'user_id'),
+    'search': (Recipe._meta.db_table, 'search_vector'),
+    'subscriptions': (Subscription._meta.db_table, 'follower_id'),
+}
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Query plans are checked on PostgreSQL only.')
+class QueryPlanTest(TestCase):
+    """Hot filters must be served by indexes, not sequential scans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f'user{index}', email=f'user{index}@example.com')
+            for index in range(USERS)
+        )
+        cls.user = users[0]
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', color='#FF0000', slug=f'tag{index}')
+            for index in range(TAGS)
+        )
+        cls.tag_slugs = [tag.slug for tag in tags[:2]]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(200)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=users[index % USERS], name=f'Рецепт {index}',
+                   text='Описание', cooking_time=10, image='')
+            for index in range(RECIPES)
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tags[(index + shift) % len(tags)])
+            for index, recipe in enumerate(recipes)
+            for shift in range(2)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(index + shift) % len(ingredients)],
+                amount=shift + 1)
+            for index, recipe in enumerate(recipes)
+            for shift in range(5)
+        )
+        for model in (Favorite, ShoppingList):
+            model.objects.bulk_create(
+                model(user=users[(index + shift) % USERS], recipe=recipe)
+                for index, recipe in enumerate(recipes)
+                for shift in range(5)
+            )
+        Subscription.objects.bulk_create(
+            Subscription(follower=follower,
+                         author=users[(index + shift) % USERS])
+            for index, follower in enumerate(users)
+            for shift in range(1, 21)
+        )
+        with connection.cursor() as cursor:
+            for table, _ in FILTERS.values():
+                cursor.execute(f'ANALYZE {table}')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_scans(self, plan, indexes):
+        """(table, leading column or None, index condition) of scans."""
+        scans = []
+        if plan['Node Type'] == 'Seq Scan':
+            scans.append((plan['Relation Name'], None, None))
+        elif plan['Node Type'] in INDEX_SCANS:
+            scans.append((*indexes[plan['Index Name']],
+                          plan.get('Index Cond', '')))
+        for child in plan.get('Plans', ()):
+            scans += self.get_scans(child, indexes)
+        return scans
+
+    def explain(self, url):
+        """Scans of every SELECT a request runs."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        scans = []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT index.relname, tab.relname, attname FROM pg_index '
+                'JOIN pg_class index ON index.oid = indexrelid '
+                'JOIN pg_class tab ON tab.oid = indrelid '
+                'JOIN pg_attribute ON attrelid = indrelid '
+                'AND attnum = indkey[0]')
+            indexes = {
+                index: (table, column)
+                for index, table, column in cursor.fetchall()
+            }
+            for query in context.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {query["sql"]}')
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scans += self.get_scans(plan[0]['Plan'], indexes)
+        return scans
+
+    def assert_uses_indexes(self, url, *filters, driving=False):
+        """Filtered tables are only reached by a leading index column.
+
+        Sequential scans and index scans without a condition on the
+        leading column read the whole table or index and fail the check.
+        With driving, the filtered column itself must lead the index: a
+        lone filter without a limit is where the plan starts. Otherwise
+        the planner may start from another filter or walk the ordering
+        index and join into the table by recipe instead.
+        """
+        scans = self.explain(url)
+        for name in filters:
+            table, column = FILTERS[name]
+            table_scans = [
+                (leading, condition) for scan_table, leading, condition
+                in scans if scan_table == table
+            ]
+            self.assertTrue(all(
+                leading and re.search(rf'\b{leading}\b', condition)
+                for leading, condition in table_scans
+            ), f'{url}: full scan of {table}: {table_scans}')
+            if driving:
+                self.assertIn(
+                    column, [leading for leading, _ in table_scans],
+                    f'{url}: no index on {table}.{column} used')
+
+    def test_recipe_filters(self):
+        filters = {
+            'author': f'author={self.user.id}',
+            'tags': '&'.join(f'tags={slug}' for slug in self.tag_slugs),
+            'is_favorited': 'is_favorited=1',
+            'is_in_shopping_cart': 'is_in_shopping_cart=1',
+        }
+        for size in range(1, len(filters) + 1):
+            for names in combinations(filters, size):
+                query = '&'.join(filters[name] for name in names)
+                with self.subTest(filters=names):
+                    self.assert_uses_indexes(
+                        f'/api/recipes/?{query}', *names,
+                        driving=len(names) == 1)
+                    self.assert_uses_indexes(
+                        f'/api/recipes/?{query}&cursor=', *names)
+
+    def test_recipe_tags_match_all(self):
+        tags = '&'.join(f'tags={slug}' for slug in self.tag_slugs)
+        self.assert_uses_indexes(
+            f'/api/recipes/?{tags}&tags_mode=all', 'tags', driving=True)
+
+    def test_recipe_search(self):
+        self.assert_uses_indexes(
+            '/api/recipes/?search=Рецепт', 'search', driving=True)
+
+    def test_subscriptions(self):
+        self.assert_uses_indexes(
+            '/api/users/subscriptions/', 'subscriptions', driving=True)
+        self.assert_uses_indexes(
+            '/api/users/subscriptions/?recipes_limit=3&cursor=',
+            'subscriptions')
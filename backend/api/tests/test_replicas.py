@@ -0,0 +1,138 @@
+from unittest import mock
+
+from asgiref.sync import SyncToAsync, iscoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIHandler
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import get_resolver
+from rest_framework import routers, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from api.mixins import ReplicaReadsMixin
+from foodgram_backend.middleware import ReplicaMiddleware
+from foodgram_backend.routers import ReplicaRouter
+from recipes.models import Recipe
+
+REPLICA = 'replica'
+
+
+class ReadsViewSet(ReplicaReadsMixin, viewsets.ViewSet):
+    """Reports the database its reads would use."""
+    authentication_classes = ()
+    permission_classes = ()
+
+    def list(self, request):
+        return Response(router.db_for_read(Recipe))
+
+    @action(detail=False, read_from_replica=False)
+    def primary(self, request):
+        return Response(router.db_for_read(Recipe))
+
+
+def get_viewsets(patterns):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from get_viewsets(pattern.url_patterns)
+        elif hasattr(pattern.callback, 'actions'):
+            yield pattern.callback.cls
+
+
+class ReplicaRoutingTest(SimpleTestCase):
+    """Reads of safe requests go to a replica until the client writes."""
+
+    def setUp(self):
+        patcher = mock.patch(
+            'foodgram_backend.routers.get_replicas', return_value=[REPLICA])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def call(self, request, write=False):
+        """Databases chosen for reads before and after an optional write."""
+        used = {}
+
+        def get_response(request):
+            used['read'] = router.db_for_read(Recipe)
+            if write:
+                used['write'] = router.db_for_write(Recipe)
+                used['read_after_write'] = router.db_for_read(Recipe)
+            return HttpResponse()
+
+        return used, ReplicaMiddleware(get_response)(request)
+
+    def test_safe_request_reads_replica(self):
+        for method in ('get', 'head', 'options'):
+            used, response = self.call(getattr(self.factory, method)('/'))
+            self.assertEqual(used['read'], REPLICA)
+            self.assertNotIn(ReplicaMiddleware.pin_cookie, response.cookies)
+
+    def test_unsafe_request_reads_primary(self):
+        for method in ('post', 'put', 'patch', 'delete'):
+            used, _ = self.call(getattr(self.factory, method)('/'))
+            self.assertEqual(used['read'], 'default')
+
+    def test_write_pins_request_and_sets_cookie(self):
+        used, response = self.call(self.factory.get('/'), write=True)
+        self.assertEqual(used['read'], REPLICA)
+        self.assertEqual(used['write'], 'default')
+        self.assertEqual(used['read_after_write'], 'default')
+        cookie = response.cookies[ReplicaMiddleware.pin_cookie]
+        self.assertTrue(cookie['max-age'])
+        self.assertTrue(cookie['httponly'])
+
+    def test_pin_cookie_reads_primary(self):
+        self.factory.cookies[ReplicaMiddleware.pin_cookie] = '1'
+        used, _ = self.call(self.factory.get('/'))
+        self.assertEqual(used['read'], 'default')
+
+    async def test_async_request(self):
+        used = {}
+
+        async def get_response(request):
+            used['read'] = router.db_for_read(Recipe)
+            used['write'] = router.db_for_write(Recipe)
+            used['read_after_write'] = router.db_for_read(Recipe)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(self.factory.get('/'))
+        self.assertEqual(used, {'read': REPLICA, 'write': 'default',
+                                'read_after_write': 'default'})
+        self.assertIn(ReplicaMiddleware.pin_cookie, response.cookies)
+
+    def test_asgi_chain_stays_async(self):
+        handler = ASGIHandler()
+        handler.load_middleware(is_async=True)
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
+
+    def test_view_override(self):
+        # The router hands @action kwargs to as_view, as in the project.
+        router = routers.SimpleRouter()
+        router.register('reads', ReadsViewSet, 'reads')
+        views = {pattern.name: pattern.callback for pattern in router.urls}
+        for name, expected in (('reads-list', REPLICA),
+                               ('reads-primary', 'default')):
+            response = ReplicaMiddleware(views[name])(self.factory.get('/'))
+            self.assertEqual(response.data, expected)
+
+    def test_every_viewset_accepts_override(self):
+        viewsets = set(get_viewsets(get_resolver().url_patterns))
+        self.assertTrue(viewsets)
+        for viewset in viewsets:
+            with self.subTest(viewset=viewset.__name__):
+                self.assertTrue(issubclass(viewset, ReplicaReadsMixin))
+                viewset.as_view({'get': 'list'}, read_from_replica=False)
+
+    def test_outside_request_routing_is_left_to_django(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(Recipe))
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+
+    def test_not_used_without_replicas(self):
+        with mock.patch('foodgram_backend.routers.get_replicas',
+                        return_value=[]):
+            with self.assertRaises(MiddlewareNotUsed):
+                ReplicaMiddleware(HttpResponse)
@@ -0,0 +1,131 @@
+import threading
+from unittest import skipIf
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Subscription, User
+
+THREADS = 8
+
+
+@skipIf(connection.vendor == 'sqlite',
+        'SQLite locks whole tables under concurrent writes.')
+class ConcurrentTogglesTest(TransactionTestCase):
+    """Parallel toggles of the same pair must not fail with 500."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='follower', email='follower@example.com',
+            password='password')
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='')
+        self.token = Token.objects.create(user=self.user)
+
+    def run_parallel(self, method, url, data=None):
+        barrier = threading.Barrier(THREADS)
+        responses = []
+
+        def send():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            try:
+                barrier.wait()
+                responses.append(
+                    getattr(client, method)(url, data, format='json'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def run_toggles(self, method, url):
+        return sorted(response.status_code
+                      for response in self.run_parallel(method, url))
+
+    def assert_toggles(self, url, queryset, counter_owner, counter_field):
+        statuses = self.run_toggles('post', url)
+        self.assertEqual(statuses, [201] + [400] * (THREADS - 1))
+        self.assertEqual(queryset.count(), 1)
+        counter_owner.refresh_from_db()
+        self.assertEqual(getattr(counter_owner, counter_field), 1)
+
+        statuses = self.run_toggles('delete', url)
+        self.assertEqual(statuses, [204] + [400] * (THREADS - 1))
+        self.assertFalse(queryset.exists())
+        counter_owner.refresh_from_db()
+        self.assertEqual(getattr(counter_owner, counter_field), 0)
+
+    def test_favorite(self):
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            Favorite.objects.filter(user=self.user, recipe=self.recipe),
+            self.recipe, 'favorites_count')
+
+    def test_shopping_cart(self):
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            ShoppingList.objects.filter(user=self.user, recipe=self.recipe),
+            self.recipe, 'shopping_list_count')
+
+    def test_subscribe(self):
+        self.assert_toggles(
+            f'/api/users/{self.author.id}/subscribe/',
+            Subscription.objects.filter(
+                follower=self.user, author=self.author),
+            self.author, 'followers_count')
+
+    def assert_batches(self, url, queryset, counter_field):
+        data = {'recipes': [self.recipe.id]}
+        for method, status, rows, counter in (('post', 'added', 1, 1),
+                                              ('delete', 'removed', 0, 0)):
+            statuses = sorted(
+                response.json()[0]['status']
+                for response in self.run_parallel(method, url, data))
+            self.assertEqual(statuses.count(status), 1, statuses)
+            self.assertEqual(queryset.count(), rows)
+            self.recipe.refresh_from_db()
+            self.assertEqual(getattr(self.recipe, counter_field), counter)
+
+    def test_favorite_batches(self):
+        self.assert_batches(
+            '/api/recipes/favorite/',
+            Favorite.objects.filter(user=self.user, recipe=self.recipe),
+            'favorites_count')
+
+    def test_shopping_cart_batches(self):
+        self.assert_batches(
+            '/api/recipes/shopping_cart/',
+            ShoppingList.objects.filter(user=self.user, recipe=self.recipe),
+            'shopping_list_count')
+
+
+class CounterColumnsTest(TestCase):
+    """Saving a loaded row keeps counters shifted after it was loaded."""
+
+    def test_saves_keep_counters(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image='')
+        author.refresh_from_db()
+        for instance, field in ((recipe, 'favorites_count'),
+                                (author, 'followers_count')):
+            type(instance).objects.filter(pk=instance.pk).update(**{field: 5})
+            instance.save()
+            instance.refresh_from_db()
+            self.assertEqual(getattr(instance, field), 5)
+        self.assertEqual(author.recipes_count, 1)
@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.authentication import get_shared_key, token_cache
+from users.models import User
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """Known tokens skip the database until they are invalidated."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password')
+
+    def setUp(self):
+        token_cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def me(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/me/')
+        return response, len(context)
+
+    def test_cached_token_saves_query(self):
+        response, cold = self.me()
+        self.assertEqual(response.status_code, 200)
+        response, warm = self.me()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(warm, cold - 1)
+
+    def test_logout(self):
+        self.me()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me()[0].status_code, 401)
+
+    def test_set_password(self):
+        self.me()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': 'password',
+                'new_password': 'Sup3r-secret-pass',
+            })
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn(self.token.key, token_cache.data)
+
+    def test_deactivation(self):
+        self.me()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.me()[0].status_code, 401)
+
+    def test_request_does_not_change_cached_user(self):
+        self.me()
+        request_user, _ = token_cache.get(self.token.key)
+        self.client.post('/api/users/set_password/', {
+            'current_password': 'password',
+            'new_password': 'Sup3r-secret-pass',
+        })
+        self.assertTrue(request_user.check_password('password'))
+
+    def test_set_password_keeps_other_columns(self):
+        self.me()
+        User.objects.filter(pk=self.user.pk).update(
+            recipes_count=F('recipes_count') + 1, first_name='Новое')
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'password',
+            'new_password': 'Sup3r-secret-pass',
+        })
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+        self.assertEqual(self.user.first_name, 'Новое')
+        self.assertTrue(self.user.check_password('Sup3r-secret-pass'))
+
+    @override_settings(TOKEN_CACHE_SHARED=True, TOKEN_CACHE_TTL=30)
+    def test_shared_copy_keeps_read_deadline(self):
+        cache.clear()
+        self.me()
+        _, warm = self.me()
+        deadline, _ = cache.get(get_shared_key(self.token.key))
+        token_cache.clear()
+        # Another process reads the shared entry 20 seconds later.
+        with mock.patch('users.authentication.time.time',
+                        return_value=deadline - 10), \
+                mock.patch('users.authentication.time.monotonic',
+                           return_value=1000):
+            self.assertEqual(self.me()[1], warm)
+            expires, _ = token_cache.data[self.token.key]
+        self.assertAlmostEqual(expires, 1010, delta=0.1)
@@ -0,0 +1,195 @@
+import csv
+import json
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+
+from recipes.models import Recipe
+
+
+def get_recipes_limit(request):
+    """Parse recipes_limit query param, None means no limit."""
+    recipes_limit = request.query_params.get('recipes_limit', '')
+    if not recipes_limit.isdigit():
+        return None
+    return int(recipes_limit)
+
+
+def add_relation(model, **fields):
+    """Insert a unique relation row, False if it already exists."""
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        return False
+    return True
+
+
+def remove_relation(model, owner_id, target_id, owner='user',
+                    target='recipe'):
+    """Delete a relation row with one DELETE, False if there was none.
+
+    The counter of the target is shifted only when the row was deleted by
+    this statement, a parallel delete of the same pair returns nothing.
+    """
+    with transaction.atomic():
+        removed = change_relations(
+            model,
+            'DELETE FROM {table} WHERE {owner} = %s AND {target} = %s '
+            'RETURNING {target}',
+            [owner_id, target_id], owner, target)
+        if removed:
+            shift_counters(model, target, removed, -1)
+    return bool(removed)
+
+
+def shift_counters(model, target, ids, delta):
+    """Shift the counter of the relation on targets with these ids."""
+    target_model = model._meta.get_field(target).related_model
+    target_model.objects.filter(id__in=ids).update(
+        **{model.counter_field: F(model.counter_field) + delta})
+
+
+def change_relations(model, sql, params, owner='user', target='recipe'):
+    """Run an INSERT or DELETE returning target ids it changed.
+
+    Statuses and counters follow the rows the database actually
+    changed, so parallel requests on the same pair do not both count.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(
+            table=quote_name(model._meta.db_table),
+            owner=quote_name(model._meta.get_field(owner).column),
+            target=quote_name(model._meta.get_field(target).column),
+        ), params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def delete_relations(model, owner_id, target_ids, owner='user',
+                     target='recipe'):
+    """Delete relation rows with one DELETE, returning removed target ids.
+
+    Unlike QuerySet.delete() it neither selects the rows first nor sends
+    per-row signals, callers do the follow-up work once.
+    """
+    values = ', '.join(['%s'] * len(target_ids))
+    return change_relations(
+        model,
+        f'DELETE FROM {{table}} WHERE {{owner}} = %s '
+        f'AND {{target}} IN ({values}) RETURNING {{target}}',
+        [owner_id, *target_ids], owner, target)
+
+
+def batch_add(model, user, recipe_ids):
+    """Add recipes to favorite or cart in a fixed number of queries."""
+    with transaction.atomic():
+        found = set(Recipe.objects.filter(
+            id__in=recipe_ids).order_by().values_list('id', flat=True))
+        added = set()
+        if found:
+            values = ', '.join(['(%s, %s)'] * len(found))
+            added = change_relations(
+                model,
+                f'INSERT INTO {{table}} ({{owner}}, {{target}}) '
+                f'VALUES {values} ON CONFLICT DO NOTHING '
+                f'RETURNING {{target}}',
+                [value for recipe_id in found
+                 for value in (user.pk, recipe_id)])
+        shift_counters(model, 'recipe', added, 1)
+    return [
+        {'id': recipe_id,
+         'status': ('not_found' if recipe_id not in found
+                    else 'added' if recipe_id in added
+                    else 'exists')}
+        for recipe_id in recipe_ids
+    ]
+
+
+def batch_remove(model, user, recipe_ids):
+    """Remove recipes from favorite or cart with one DELETE."""
+    with transaction.atomic():
+        removed = delete_relations(model, user.pk, recipe_ids)
+        shift_counters(model, 'recipe', removed, -1)
+    return [
+        {'id': recipe_id,
+         'status': 'removed' if recipe_id in removed else 'absent'}
+        for recipe_id in recipe_ids
+    ]
+
+
+class Echo:
+    """Pseudo buffer returning written value for csv.writer."""
+    def write(self, value):
+        return value
+
+
+class ShoppingCartFormat:
+    """Shopping cart file written row by row from sync or async rows."""
+    def header(self, user):
+        return ''
+
+    def row(self, item, index):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+    def render(self, user, ingredients):
+        yield self.header(user)
+        for index, item in enumerate(ingredients):
+            yield self.row(item, index)
+        yield self.footer()
+
+    async def arender(self, user, ingredients):
+        yield self.header(user)
+        index = 0
+        async for item in ingredients:
+            yield self.row(item, index)
+            index += 1
+        yield self.footer()
+
+
+class ShoppingCartTxt(ShoppingCartFormat):
+    def header(self, user):
+        return f'Ваш список покупок, {user.first_name}!\n'
+
+    def row(self, item, index):
+        return (f'{item["ingredient__name"]}: {item["total"]} '
+                f'{item["ingredient__measurement_unit"]}\n')
+
+
+class ShoppingCartCsv(ShoppingCartFormat):
+    writer = csv.writer(Echo())
+
+    def header(self, user):
+        return self.writer.writerow(
+            ('Продукт', 'Количество', 'Единицы измерения'))
+
+    def row(self, item, index):
+        return self.writer.writerow((item['ingredient__name'],
+                                     item['total'],
+                                     item['ingredient__measurement_unit']))
+
+
+class ShoppingCartJson(ShoppingCartFormat):
+    def header(self, user):
+        return '['
+
+    def row(self, item, index):
+        return (',' if index else '') + json.dumps({
+            'name': item['ingredient__name'],
+            'amount': item['total'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+
+    def footer(self):
+        return ']'
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': ShoppingCartTxt(),
+    'csv': ShoppingCartCsv(),
+    'json': ShoppingCartJson(),
+}
@@ -1,123 +1,168 @@
-from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from adrf import viewsets as async_viewsets
+from adrf.generics import aget_object_or_404
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Exists, OuterRef, Prefetch, Sum
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework import viewsets, mixins, permissions, serializers
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
 from recipes.models import (RecipeIngredient, Favorite, Recipe,
                             User, ShoppingList)
 from users.models import Subscription
+from foodgram_backend import constants
 from .serializers import (FavoriteRecipeSerializer, RecipeSerializer,
-                          RecipeListSerializer, SubscribeSerializer)
+                          RecipeListSerializer, SubscribeSerializer,
+                          RecipeIdsSerializer)
+from .mixins import (AnonymousCacheMixin, ReplicaReadsMixin,
+                     SerializationTimingMixin)
 from .permissions import IsAuthorOrReadOnly
-from .paginators import RecipePagination
+from .paginators import RecipePagination, SubscribePagination
+from .renderers import PlainTextRenderer, CSVRenderer
+from .utils import (SHOPPING_CART_FORMATS, add_relation, batch_add,
+                    batch_remove, get_recipes_limit, remove_relation)
 
 
-class FavoriteViewSet(viewsets.GenericViewSet):
+# Toggles look rows up on the async ORM, but the write itself still
+# holds a worker thread through sync_to_async: Django 4.2 has no async
+# transactions, and a relation row must commit with its counter.
+class FavoriteViewSet(ReplicaReadsMixin, async_viewsets.GenericViewSet):
     """Add and delete favorite recipe."""
     permission_classes = (permissions.IsAuthenticated,)
+    query_budget = {'create': 6, 'delete': 5}
 
-    def create(self, request, *args, **kwargs):
-        if Recipe.objects.filter(id=kwargs.get('recipe_id')).exists():
-            recipe = Recipe.objects.get(id=kwargs.get('recipe_id'))
-        else:
+    async def create(self, request, *args, **kwargs):
+        recipe = await Recipe.objects.filter(
+            id=kwargs.get('recipe_id')).afirst()
+        if recipe is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        user = request.user
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
+        if not await sync_to_async(add_relation)(
+                Favorite, user=request.user, recipe=recipe):
             raise serializers.ValidationError(
                 'Вы уже добавили в избранное этот рецепт.')
-        Favorite.objects.create(user=user, recipe=recipe)
         serializer = FavoriteRecipeSerializer(instance=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=['delete'], detail=False)
-    def delete(self, request, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs.get('recipe_id'))
-        user = request.user
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            Favorite.objects.filter(user=user, recipe=recipe).delete()
+    async def delete(self, request, *args, **kwargs):
+        recipe_id = kwargs.get('recipe_id')
+        if await sync_to_async(remove_relation)(
+                Favorite, request.user.pk, recipe_id):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        await aget_object_or_404(Recipe.objects.all(), id=recipe_id)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class ShoppingListViewSet(viewsets.GenericViewSet):
+class ShoppingListViewSet(ReplicaReadsMixin,
+                          async_viewsets.GenericViewSet):
     """Add and delete to shopping cart."""
     permission_classes = (permissions.IsAuthenticated,)
+    query_budget = {'create': 6, 'delete': 5}
 
-    def create(self, request, *args, **kwargs):
-        if Recipe.objects.filter(id=kwargs.get('recipe_id')).exists():
-            recipe = Recipe.objects.get(id=kwargs.get('recipe_id'))
-        else:
+    async def create(self, request, *args, **kwargs):
+        recipe = await Recipe.objects.filter(
+            id=kwargs.get('recipe_id')).afirst()
+        if recipe is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        user = request.user
-        if ShoppingList.objects.filter(user=user, recipe=recipe).exists():
+        if not await sync_to_async(add_relation)(
+                ShoppingList, user=request.user, recipe=recipe):
             raise serializers.ValidationError(
                 'Вы уже добавили в корзину этот рецепт.')
-        ShoppingList.objects.create(user=user, recipe=recipe)
         serializer = FavoriteRecipeSerializer(instance=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=['delete'], detail=False)
-    def delete(self, request, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs.get('recipe_id'))
-        user = request.user
-        if ShoppingList.objects.filter(user=user, recipe=recipe).exists():
-            ShoppingList.objects.filter(user=user, recipe=recipe).delete()
+    async def delete(self, request, *args, **kwargs):
+        recipe_id = kwargs.get('recipe_id')
+        if await sync_to_async(remove_relation)(
+                ShoppingList, request.user.pk, recipe_id):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        await aget_object_or_404(Recipe.objects.all(), id=recipe_id)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class SubscribeViewSet(viewsets.GenericViewSet):
+class SubscribeViewSet(ReplicaReadsMixin, async_viewsets.GenericViewSet):
     """Add and delete subscription."""
     permission_classes = (permissions.IsAuthenticated,)
+    query_budget = {'create': 8, 'delete': 5}
 
-    def create(self, request, *args, **kwargs):
-        user = get_object_or_404(User, id=kwargs.get('user_id'))
+    async def create(self, request, *args, **kwargs):
+        user = await aget_object_or_404(
+            User.objects.all(), id=kwargs.get('user_id'))
         follower = request.user
-        if Subscription.objects.filter(
-                follower=follower, author=user).exists() or user == follower:
+        if user == follower or not await sync_to_async(add_relation)(
+                Subscription, follower=follower, author=user):
             raise serializers.ValidationError(
                 'Вы уже подписаны или подписываетесь на себя.')
-        Subscription.objects.create(follower=follower, author=user)
         serializer = SubscribeSerializer(
             instance=user, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        data = await sync_to_async(lambda: serializer.data)()
+        return Response(data, status=status.HTTP_201_CREATED)
 
     @action(methods=['delete'], detail=False)
-    def delete(self, request, *args, **kwargs):
-        user = get_object_or_404(User, id=kwargs.get('user_id'))
-        follower = request.user
-        if Subscription.objects.filter(
-                follower=follower, author=user).exists():
-            Subscription.objects.filter(
-                follower=follower, author=user).delete()
+    async def delete(self, request, *args, **kwargs):
+        user_id = kwargs.get('user_id')
+        if await sync_to_async(remove_relation)(
+                Subscription, request.user.pk, user_id,
+                owner='follower', target='author'):
             return Response(status=status.HTTP_204_NO_CONTENT)
+        await aget_object_or_404(User.objects.all(), id=user_id)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class SubscribeListViewSet(viewsets.GenericViewSet,
+class SubscribeListViewSet(ReplicaReadsMixin, SerializationTimingMixin,
+                           viewsets.GenericViewSet,
                            mixins.ListModelMixin):
     """Get favorite authors."""
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = SubscribeSerializer
-    pagination_class = RecipePagination
+    pagination_class = SubscribePagination
+    query_budget = {'list': 5}
 
     def get_queryset(self):
+        recipes_limit = get_recipes_limit(self.request)
         queryset = User.objects.filter(
             followers__follower=self.request.user
-        ).all()
+        ).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=Recipe.objects.only(
+                    'id', 'name', 'image', 'variants_image', 'cooking_time',
+                    'author_id'
+                ).order_by('name', 'id')[:recipes_limit],
+                to_attr='recipes_preview'
+            )
+        ).order_by('username', 'id')
         return queryset
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadsMixin, SerializationTimingMixin,
+                    AnonymousCacheMixin, viewsets.ModelViewSet):
     """Viewset for Recipe model."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = RecipePagination
+    page_cache_version_key = constants.RECIPES_VERSION_KEY
+    # Queries per request whatever the page size or nested rows,
+    # checked by api/tests/test_query_budgets.py.
+    query_budget = {
+        'list': 6,
+        'retrieve': 5,
+        'create': 15,
+        'update': 17,
+        'partial_update': 18,
+        'destroy': 11,
+        'download_shopping_cart': 2,
+        'favorite_batch': 7,
+        'shopping_cart_batch': 7,
+        'cache_stats': 1,
+    }
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -130,43 +175,95 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         author = self.request.query_params.get('author')
         tags = self.request.query_params.getlist('tags')
+        tags_mode = self.request.query_params.get('tags_mode')
         is_favorited = self.request.query_params.get('is_favorited')
         is_in_shopping_cart = self.request.query_params.get(
             'is_in_shopping_cart')
-        queryset = Recipe.objects.prefetch_related('r_tags')
+        search = self.request.query_params.get('search')
+        queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related()
+
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
 
         if author:
             queryset = queryset.filter(author__id=author)
         if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
-        if is_favorited and self.request.user.is_authenticated:
-            queryset = queryset.filter(favorite__user=self.request.user)
-        if is_in_shopping_cart and self.request.user.is_authenticated:
-            queryset = queryset.filter(shoppinglist__user=self.request.user)
+            queryset = queryset.with_tags(
+                tags, match_all=tags_mode == constants.TAGS_MODE_ALL)
+        if is_favorited and user.is_authenticated:
+            queryset = queryset.filter(is_favorited=True)
+        if is_in_shopping_cart and user.is_authenticated:
+            queryset = queryset.filter(is_in_shopping_cart=True)
+        if search:
+            queryset = queryset.search(search)
         return queryset
 
     @action(detail=False,
             methods=['GET'],
-            permission_classes=[permissions.IsAuthenticated])
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request):
-        recipes = Recipe.objects.filter(shoppinglist__user=request.user)
         ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipes).all()
-
-        shopping_cart = {}
-        m_units = {}
-        for ingredient in ingredients:
-            name = ingredient.ingredient.name
-            amount = ingredient.amount
-            if name in shopping_cart:
-                shopping_cart[name] += amount
-            else:
-                shopping_cart[name] = amount
-                m_units[name] = ingredient.ingredient.measurement_unit
-
-        text = f'Ваш список покупок, {request.user.first_name}!\n'
-        for key, value in shopping_cart.items():
-            text += f'{key}: {value} {m_units[key]}\n'
-
-        return HttpResponse(
-            text, content_type='text/plain', status=status.HTTP_200_OK)
+            recipe__shoppinglist__user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by('ingredient__name')
+
+        file_format = request.accepted_renderer.format
+        cart_format = SHOPPING_CART_FORMATS[file_format]
+        if isinstance(request._request, ASGIRequest):
+            # A sync iterator would be collected whole before sending.
+            content = cart_format.arender(
+                request.user, ingredients.aiterator())
+        else:
+            content = cart_format.render(
+                request.user, ingredients.iterator())
+        response = StreamingHttpResponse(
+            content,
+            content_type=request.accepted_renderer.media_type,
+            status=status.HTTP_200_OK
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"')
+        return response
+
+    def batch_toggle(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(
+            serializer.validated_data['recipes']))
+        if request.method == 'POST':
+            results = batch_add(model, request.user, recipe_ids)
+        else:
+            results = batch_remove(model, request.user, recipe_ids)
+        return Response(results, status=status.HTTP_200_OK)
+
+    @action(detail=False,
+            methods=['POST', 'DELETE'],
+            url_path='favorite',
+            permission_classes=[permissions.IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.batch_toggle(request, Favorite)
+
+    @action(detail=False,
+            methods=['POST', 'DELETE'],
+            url_path='shopping_cart',
+            permission_classes=[permissions.IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.batch_toggle(request, ShoppingList)
+
+    @action(detail=False,
+            methods=['GET'],
+            permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        return Response(self.get_page_cache_stats())
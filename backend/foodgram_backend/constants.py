@@ -5,3 +5,31 @@ LONG_CHAR_LEN = 254
 MIN_INT_VALIDATOR = 1
 MAX_AMOUNT_VALIDATOR = 1000
 MAX_TIME_VALIDATOR = 720
+
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 100
+TAGS_MODE_ALL = 'all'
+INGREDIENT_SEARCH_LIMIT = 50
+
+INGREDIENTS_VERSION_KEY = 'ingredients_version'
+TAGS_VERSION_KEY = 'tags_version'
+RECIPES_VERSION_KEY = 'recipes_version'
+CATALOG_CACHE_SIZE = 512
+CATALOG_MAX_AGE = 60 * 60
+PAGE_CACHE_TIMEOUT = 60 * 5
+PAGE_CACHE_STATS_FLUSH = 100
+IMPORT_BATCH_SIZE = 1000
+SEED_SAMPLE_ROUNDS = 10
+TOKEN_CACHE_SIZE = 1024
+SEARCH_CONFIG = 'russian'
+
+IMAGE_VARIANTS = (
+    ('thumbnail', (480, 480)),
+    ('detail', (1200, 1200)),
+)
+IMAGE_VARIANT_FORMATS = (
+    ('', 'jpg', 'JPEG'),
+    ('_webp', 'webp', 'WEBP'),
+)
+IMAGE_QUALITY = 85
+IMAGE_WORKERS = 2
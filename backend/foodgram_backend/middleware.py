@@ -0,0 +1,197 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.permissions import SAFE_METHODS
+
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+_query_stats = ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    """Execute wrapper counting queries and their total time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def count_queries(execute, sql, params, many, context):
+    """Execute wrapper feeding the QueryStats of the current request."""
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    # Inserted first, so that execute_wrapper() blocks still pop their own.
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+def install_query_counters(**kwargs):
+    """Cover connections the request thread opened before profiling."""
+    for connection in connections.all(initialized_only=True):
+        install_query_counter(connection)
+
+
+class RequestProfilingMiddleware:
+    """Query count and timings of every request in response headers.
+
+    Enabled by REQUEST_PROFILING, otherwise Django drops the middleware
+    from the chain at startup and requests do not pass through it.
+    Views with SerializationTimingMixin also report their serializer work.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Connections are per thread and async views query from worker
+        # threads, so every connection reports to the request in context.
+        # request_started is sent in the thread the request queries from.
+        connection_created.connect(install_query_counter)
+        request_started.connect(install_query_counters)
+        install_query_counters()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django awaits the hooks of an async chain, plain ones would
+            # each take a trip to a worker thread.
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.measure(request) as (stats, started):
+            response = self.get_response(request)
+        return self.report(request, response, stats, started)
+
+    async def __acall__(self, request):
+        with self.measure(request) as (stats, started):
+            response = await self.get_response(request)
+        return self.report(request, response, stats, started)
+
+    @contextmanager
+    def measure(self, request):
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        request.profiling_marks = {}
+        try:
+            yield stats, time.perf_counter()
+        finally:
+            _query_stats.reset(token)
+
+    def report(self, request, response, stats, started):
+        finished = time.perf_counter()
+        marks = request.profiling_marks
+        view_started = marks.get('view', started)
+        view_finished = marks.get('render', finished)
+        timings = {
+            'db': stats.duration,
+            'view': view_finished - view_started,
+        }
+        if 'serialized' in marks:
+            timings['serialize'] = marks['serialized'] - marks['serialize']
+        timings['render'] = finished - view_finished
+        timings['total'] = finished - started
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in timings.items())
+        response['X-DB-Queries'] = str(stats.count)
+
+        slow = timings['total'] * 1000 > settings.REQUEST_PROFILING_SLOW_MS
+        if stats.count > settings.REQUEST_PROFILING_MAX_QUERIES or slow:
+            match = request.resolver_match
+            logger.warning(
+                '%s %s (%s): %d queries, db %.1f ms, total %.1f ms',
+                request.method, request.path,
+                match.view_name if match else '-', stats.count,
+                timings['db'] * 1000, timings['total'] * 1000)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.mark_view(request)
+
+    def process_template_response(self, request, response):
+        return self.mark_render(request, response)
+
+    async def aprocess_view(self, request, view_func, view_args,
+                            view_kwargs):
+        self.mark_view(request)
+
+    async def aprocess_template_response(self, request, response):
+        return self.mark_render(request, response)
+
+    def mark_view(self, request):
+        request.profiling_marks['view'] = time.perf_counter()
+
+    def mark_render(self, request, response):
+        # DRF responses are rendered after this hook, the rest is render.
+        request.profiling_marks['render'] = time.perf_counter()
+        return response
+
+
+class ReplicaMiddleware:
+    """Let reads of safe requests go to database replicas.
+
+    A request stays on the primary once it writes, when its view or
+    action sets read_from_replica = False (see ReplicaReadsMixin), and
+    for REPLICA_PIN_SECONDS after a write by the same client, so it
+    reads its own writes.
+    """
+    pin_cookie = 'primary_db'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not routers.get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Under ASGI the chain stays async instead of going to a thread.
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.replica_reads(self.reads_replica(request)) as state:
+            response = self.get_response(request)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        with routers.replica_reads(self.reads_replica(request)) as state:
+            response = await self.get_response(request)
+        return self.pin(state, response)
+
+    def reads_replica(self, request):
+        return (request.method in SAFE_METHODS
+                and self.pin_cookie not in request.COOKIES)
+
+    def pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                self.pin_cookie, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
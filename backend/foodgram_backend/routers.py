@@ -0,0 +1,70 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_replica_state = ContextVar('replica_state', default=None)
+
+
+def get_replicas():
+    """Aliases of every database besides the primary."""
+    return [alias for alias in settings.DATABASES
+            if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaState:
+    """Replica chosen for the current request, None means primary."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+
+
+@contextmanager
+def replica_reads(enabled):
+    """Route reads inside the block to one replica when enabled."""
+    replicas = get_replicas()
+    state = ReplicaState(
+        random.choice(replicas) if enabled and replicas else None)
+    token = _replica_state.set(state)
+    try:
+        yield state
+    finally:
+        _replica_state.reset(token)
+
+
+def pin_primary():
+    """Send the rest of the current request to the primary."""
+    state = _replica_state.get()
+    if state is not None:
+        state.alias = None
+
+
+class ReplicaRouter:
+    """Reads of safe requests go to a replica, everything else to primary.
+
+    Outside of requests (shell, management commands) routing is left to
+    Django defaults.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _replica_state.get()
+        if state is None:
+            return None
+        return state.alias or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _replica_state.get()
+        if state is not None:
+            # Later reads of this request must see the write.
+            state.alias = None
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
@@ -33,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram_backend.middleware.RequestProfilingMiddleware',
+    'foodgram_backend.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,12 +77,44 @@ DATABASES = {
     }
 }
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
-# }
+if os.getenv('DB_SQLITE', 'false').lower() in ('true', '1',):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+# Every alias besides default is a read replica of it. PostgreSQL
+# replicas differ from default by host, SQLite ones by file name.
+for key, variable in (('HOST', 'DB_REPLICA_HOSTS'),
+                      ('NAME', 'DB_REPLICA_NAMES')):
+    for value in filter(None, map(str.strip,
+                                  os.getenv(variable, '').split(','))):
+        DATABASES[f'replica_{len(DATABASES) - 1}'] = {
+            **DATABASES['default'],
+            key: value,
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['foodgram_backend.routers.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+# Data versions live in the cache and are bumped by workers and by
+# management commands run with docker compose exec, so every process
+# of the container must see the same cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -121,6 +156,12 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+REQUEST_PROFILING = os.getenv(
+    'REQUEST_PROFILING', 'false').lower() in ('true', '1',)
+REQUEST_PROFILING_MAX_QUERIES = int(
+    os.getenv('REQUEST_PROFILING_MAX_QUERIES', 20))
+REQUEST_PROFILING_SLOW_MS = int(os.getenv('REQUEST_PROFILING_SLOW_MS', 500))
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -128,7 +169,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
@@ -141,3 +182,7 @@ DJOSER = {
         'user_list': ['rest_framework.permissions.AllowAny'],
     }
 }
+
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))
+TOKEN_CACHE_SHARED = os.getenv(
+    'TOKEN_CACHE_SHARED', 'false').lower() in ('true', '1',)
@@ -0,0 +1,20 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    """Shared data version, a missing key restarts from a timestamp."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Invalidate everything built for the current version."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(key)
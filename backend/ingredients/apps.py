@@ -5,3 +5,6 @@ class IngredientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ingredients'
     verbose_name = 'Ингредиенты'
+
+    def ready(self):
+        from . import signals  # noqa: F401
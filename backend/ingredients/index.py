@@ -0,0 +1,49 @@
+import threading
+from bisect import bisect_left
+
+from foodgram_backend import constants, routers
+from foodgram_backend.versions import get_version
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Sorted in-memory prefix index, rebuilt on catalog version change."""
+    def __init__(self):
+        self.version = None
+        self.keys = []
+        self.ingredients = []
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version = get_version(constants.INGREDIENTS_VERSION_KEY)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            # Replicas may not have the rows of this version yet.
+            routers.pin_primary()
+            ingredients = sorted(
+                Ingredient.objects.all(),
+                key=lambda ingredient: (ingredient.name.lower(),
+                                        ingredient.id)
+            )
+            self.keys = [ingredient.name.lower()
+                         for ingredient in ingredients]
+            self.ingredients = ingredients
+            self.version = version
+
+    def search(self, prefix, limit=constants.INGREDIENT_SEARCH_LIMIT):
+        self.refresh()
+        keys, ingredients = self.keys, self.ingredients
+        prefix = prefix.lower()
+        result = []
+        index = bisect_left(keys, prefix)
+        while (index < len(keys) and len(result) < limit
+               and keys[index].startswith(prefix)):
+            result.append(ingredients[index])
+            index += 1
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -1,40 +1,135 @@
 import csv
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram_backend import constants
+from foodgram_backend.versions import bump_version
 from ingredients.models import Ingredient
 from recipes.models import Tag
 
+CATALOGS = {
+    'ingredients': {
+        'model': Ingredient,
+        'fields': ('name', 'measurement_unit'),
+        'unique_fields': ('name', 'measurement_unit'),
+        'update_fields': (),
+        'version_key': constants.INGREDIENTS_VERSION_KEY,
+    },
+    'tags': {
+        'model': Tag,
+        'fields': ('name', 'color', 'slug'),
+        'unique_fields': ('slug',),
+        'update_fields': ('name', 'color'),
+        'version_key': constants.TAGS_VERSION_KEY,
+    },
+}
+
 
 class Command(BaseCommand):
+    help = ('Загрузка справочников ингредиентов и тегов из csv или json. '
+            'Повторный запуск не создает дубликатов.')
+
     def add_arguments(self, parser):
-        parser.add_argument('filename', type=str, help='Имя csv-файла')
+        parser.add_argument(
+            'filename', type=str,
+            help='Имя справочника (ingredients, tags) или путь к csv/json')
+        parser.add_argument(
+            '--catalog', choices=CATALOGS,
+            help='Справочник, по умолчанию берется из имени файла')
+        parser.add_argument(
+            '--batch-size', type=int, default=constants.IMPORT_BATCH_SIZE,
+            help='Количество строк в одном INSERT')
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Обновлять существующие записи вместо пропуска')
 
     def handle(self, *args, **options):
-        filename_method = {
-            'ingredients': self.import_ingredient,
-            'tags': self.import_tag,
-        }
         filename = options['filename']
-        file_path = f'data/{filename}.csv'
-
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            import_method = filename_method[filename]
-
-            for row in reader:
-                import_method(row)
-
-    def import_ingredient(self, row):
-        name, measurement_unit = row
-        Ingredient.objects.create(
-            name=name,
-            measurement_unit=measurement_unit
-        )
-
-    def import_tag(self, row):
-        name, color, slug = row
-        Tag.objects.create(
-            name=name,
-            color=color,
-            slug=slug
-        )
+        path = Path(filename)
+        if not path.suffix:
+            path = Path(settings.BASE_DIR) / 'data' / f'{filename}.csv'
+        catalog_name = options['catalog'] or path.stem
+        if catalog_name not in CATALOGS:
+            raise CommandError(
+                f'Неизвестный справочник {catalog_name}, укажите --catalog.')
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+
+        catalog = CATALOGS[catalog_name]
+        model = catalog['model']
+        update = options['update'] and catalog['update_fields']
+        conflict_options = {'ignore_conflicts': True}
+        if update:
+            conflict_options = {
+                'update_conflicts': True,
+                'unique_fields': catalog['unique_fields'],
+                'update_fields': catalog['update_fields'],
+            }
+
+        rows = self.read_rows(path, catalog['fields'])
+        objects = self.unique_objects(rows, catalog)
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            count_before = model.objects.count()
+            while True:
+                batch = list(islice(objects, batch_size))
+                if not batch:
+                    break
+                model.objects.bulk_create(batch, **conflict_options)
+            inserted = model.objects.count() - count_before
+            transaction.on_commit(
+                lambda: bump_version(catalog['version_key']))
+
+        existing = self.processed - inserted
+        updated, skipped = (existing, 0) if update else (0, existing)
+        self.stdout.write(self.style.SUCCESS(
+            f'{catalog_name}: добавлено {inserted}, '
+            f'обновлено {updated}, '
+            f'пропущено {skipped + self.duplicates}.'
+        ))
+
+    def unique_objects(self, rows, catalog):
+        """Build model instances, dropping duplicate keys of the file."""
+        self.processed = self.duplicates = 0
+        seen = set()
+        for row in rows:
+            key = tuple(row[field] for field in catalog['unique_fields'])
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            self.processed += 1
+            yield catalog['model'](**row)
+
+    def read_rows(self, path, fields):
+        if path.suffix == '.json':
+            return self.read_json(path, fields)
+        return self.read_csv(path, fields)
+
+    def read_csv(self, path, fields):
+        with open(path, 'r', encoding='utf-8') as file:
+            for line_num, row in enumerate(csv.reader(file), start=1):
+                if not row:
+                    continue
+                if len(row) != len(fields):
+                    raise CommandError(
+                        f'{path}:{line_num}: ожидались поля '
+                        f'{", ".join(fields)}.')
+                yield dict(zip(fields, row))
+
+    def read_json(self, path, fields):
+        with open(path, 'r', encoding='utf-8') as file:
+            items = json.load(file)
+        for index, item in enumerate(items):
+            try:
+                yield {field: item[field] for field in fields}
+            except (KeyError, TypeError):
+                raise CommandError(
+                    f'{path}[{index}]: ожидались поля {", ".join(fields)}.')
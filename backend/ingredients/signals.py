@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram_backend import constants
+from foodgram_backend.versions import bump_version
+from .models import Ingredient
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    transaction.on_commit(
+        lambda: bump_version(constants.INGREDIENTS_VERSION_KEY))
@@ -1,13 +1,19 @@
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 from django_filters import rest_framework as filters
 
+from api.mixins import (CatalogCacheMixin, ReplicaReadsMixin,
+                        SerializationTimingMixin)
+from foodgram_backend import constants
 from .models import Ingredient
 from .serializers import IngredientSerializer
 from .filters import IngredientFilter
+from .index import ingredient_index
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadsMixin, SerializationTimingMixin,
+                        CatalogCacheMixin, ReadOnlyModelViewSet):
     """Access Ingredient model."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -15,3 +21,16 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     permission_classes = (AllowAny,)
     pagination_class = None
+    catalog_version_key = constants.INGREDIENTS_VERSION_KEY
+    query_budget = {'list': 1, 'retrieve': 1}
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('name'):
+            return super().list(request, *args, **kwargs)
+        return self.get_catalog_response(
+            self.search, request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        serializer = self.get_serializer(
+            ingredient_index.search(request.query_params['name']), many=True)
+        return Response(serializer.data)
@@ -21,7 +21,7 @@ class TagAdmin(admin.ModelAdmin):
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'name',
-                    'image', 'cooking_time', 'ings')
+                    'image', 'cooking_time', 'ings', 'favorites_count')
     empty_value_display = '-пусто-'
     inlines = (RecipeIngredientInline, RecipeTagInline,)
 
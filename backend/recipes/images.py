@@ -0,0 +1,85 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image
+
+from foodgram_backend import constants
+from foodgram_backend.versions import bump_version
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=constants.IMAGE_WORKERS,
+    thread_name_prefix='image-variants'
+)
+
+
+def get_variant_names(image_name):
+    """Storage names of every variant, the last one is written last."""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    return {
+        f'{variant}{suffix}': posixpath.join(
+            directory, 'variants', f'{stem}_{variant}.{extension}')
+        for variant, _ in constants.IMAGE_VARIANTS
+        for suffix, extension, _ in constants.IMAGE_VARIANT_FORMATS
+    }
+
+
+def get_variant_urls(recipe):
+    """Variant urls, original image url until variants are generated."""
+    image = recipe.image
+    if not image:
+        return {}
+    names = get_variant_names(image.name)
+    if recipe.variants_image != image.name:
+        return {variant: image.url for variant in names}
+    return {variant: default_storage.url(name)
+            for variant, name in names.items()}
+
+
+def generate_variants(image_name):
+    """Write missing variants, then mark recipes with this image ready."""
+    names = get_variant_names(image_name)
+    if not default_storage.exists(list(names.values())[-1]):
+        write_variants(image_name, names)
+    if Recipe.objects.filter(image=image_name).exclude(
+            variants_image=image_name).update(variants_image=image_name):
+        bump_version(constants.RECIPES_VERSION_KEY)
+
+
+def write_variants(image_name, names):
+    with default_storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+    if original.mode not in ('RGB', 'L'):
+        original = original.convert('RGB')
+    for variant, size in constants.IMAGE_VARIANTS:
+        image = original.copy()
+        image.thumbnail(size)
+        for suffix, _, image_format in constants.IMAGE_VARIANT_FORMATS:
+            buffer = BytesIO()
+            image.save(buffer, image_format,
+                       quality=constants.IMAGE_QUALITY)
+            name = names[f'{variant}{suffix}']
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def schedule_variants(image_name):
+    """Generate variants in the worker pool, failures are only logged."""
+    def task():
+        try:
+            generate_variants(image_name)
+        except Exception:
+            logger.exception('Image variants failed for %s', image_name)
+        finally:
+            close_old_connections()
+    return executor.submit(task)
@@ -0,0 +1,18 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import schedule_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Генерация уменьшенных и WebP версий картинок рецептов.'
+
+    def handle(self, *args, **options):
+        images = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True)
+        futures = [schedule_variants(image) for image in images.iterator()]
+        wait(futures)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(futures)}.'))
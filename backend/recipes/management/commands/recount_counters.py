@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram_backend.counters import count_subquery
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков избранного, корзины, рецептов и подписчиков.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_subquery(Favorite, 'recipe'),
+                shopping_list_count=count_subquery(ShoppingList, 'recipe'),
+            )
+            users = User.objects.update(
+                recipes_count=count_subquery(Recipe, 'author'),
+                followers_count=count_subquery(Subscription, 'author'),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}.'))
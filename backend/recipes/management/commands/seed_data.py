@@ -0,0 +1,189 @@
+import random
+import time
+from io import StringIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram_backend import constants
+from foodgram_backend.versions import bump_version
+from ingredients.models import Ingredient
+from recipes.models import (Favorite, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingList, Tag)
+from users.models import Subscription, User
+
+USERNAME_PREFIX = 'seed_user_'
+RECIPE_TEXT = ('Нарежьте ингредиенты, смешайте и готовьте до готовности. '
+               'Подавайте горячим.')
+
+
+class ZipfSampler:
+    """Weighted choice where the item of rank n has weight 1 / n ** s."""
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.rng = rng
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+
+    def choice(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def sample(self, size, exclude=None):
+        """Distinct items, popular ones are picked more often."""
+        size = min(size, len(self.items) - (exclude is not None))
+        chosen = set()
+        for _ in range(constants.SEED_SAMPLE_ROUNDS):
+            if len(chosen) >= size:
+                break
+            chosen.update(self.rng.choices(
+                self.items, cum_weights=self.cum_weights,
+                k=size - len(chosen)))
+            chosen.discard(exclude)
+        else:
+            rest = [item for item in self.items
+                    if item not in chosen and item != exclude]
+            chosen.update(self.rng.sample(rest, size - len(chosen)))
+        return list(chosen)[:size]
+
+
+class Command(BaseCommand):
+    help = ('Заполнение базы синтетическими пользователями, рецептами, '
+            'избранным, корзинами и подписками на основе справочников.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--tags', type=int, default=0,
+            help='Минимальное число тегов, недостающие создаются')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument(
+            '--followers-per-user', type=int, default=10,
+            help='На сколько авторов подписан каждый пользователь')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--password',
+            help='Пароль пользователей, по умолчанию вход запрещен')
+        parser.add_argument(
+            '--batch-size', type=int, default=constants.IMPORT_BATCH_SIZE,
+            help='Количество строк в одном INSERT')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно минимум два пользователя и один рецепт.')
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        with transaction.atomic():
+            counts = self.seed(options)
+            transaction.on_commit(
+                lambda: bump_version(constants.RECIPES_VERSION_KEY))
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{label}: {count}' for label, count in counts.items())
+            + f'. Заняло {time.monotonic() - started:.1f} с.'))
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        tags, ingredients = self.load_catalogs(options['tags'])
+        user_ids = self.create_users(options)
+        authors = ZipfSampler(user_ids, options['zipf'], rng)
+        recipe_ids = self.create_ids(Recipe, (
+            Recipe(author_id=authors.choice(),
+                   name=f'{rng.choice(ingredients).name.capitalize()} '
+                        f'№{index}',
+                   text=RECIPE_TEXT,
+                   cooking_time=rng.randint(5, 180),
+                   image='')
+            for index in range(options['recipes'])
+        ))
+        popular = ZipfSampler(recipe_ids, options['zipf'], rng)
+
+        counts = {'Пользователей': len(user_ids), 'Рецептов': len(recipe_ids)}
+        counts['Тегов рецептов'] = self.create(RecipeTag, (
+            RecipeTag(recipe_id=recipe_id, tag=tag)
+            for recipe_id in recipe_ids
+            for tag in rng.sample(
+                tags, min(options['tags_per_recipe'], len(tags)))
+        ))
+        per_recipe = options['ingredients_per_recipe']
+        counts['Ингредиентов рецептов'] = self.create(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe_id, ingredient=ingredient,
+                             amount=rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient in rng.sample(ingredients, min(
+                rng.randint(max(per_recipe // 2, 1), per_recipe * 3 // 2),
+                len(ingredients)))
+        ))
+        for label, model, per_user in (
+                ('В избранном', Favorite, options['favorites_per_user']),
+                ('В корзинах', ShoppingList, options['cart_per_user'])):
+            counts[label] = self.create(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in popular.sample(per_user)
+            ))
+        counts['Подписок'] = self.create(Subscription, (
+            Subscription(follower_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in authors.sample(
+                options['followers_per_user'], exclude=user_id)
+        ))
+
+        call_command('recount_counters', stdout=StringIO())
+        Recipe.objects.filter(
+            id__gte=min(recipe_ids)).update_search_vector()
+        return counts
+
+    def load_catalogs(self, min_tags):
+        """Ingredients and tags from data/, extra tags up to min_tags."""
+        call_command('load_csv', 'ingredients', stdout=StringIO())
+        call_command('load_csv', 'tags', stdout=StringIO())
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', color='#808080', slug=f'tag{index}')
+            for index in range(Tag.objects.count(), min_tags)
+        )
+        tags = list(Tag.objects.all())
+        ingredients = list(Ingredient.objects.all())
+        if not (tags and ingredients):
+            raise CommandError('Справочники тегов и ингредиентов пусты.')
+        return tags, ingredients
+
+    def create_users(self, options):
+        # Hashing is slow, every seeded user shares one hash.
+        password = make_password(options['password'])
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).count()
+        return self.create_ids(User, (
+            User(username=f'{USERNAME_PREFIX}{index}',
+                 email=f'{USERNAME_PREFIX}{index}@example.com',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for index in range(start, start + options['users'])
+        ))
+
+    def insert(self, model, objects):
+        """Insert objects in batches, yield every inserted batch."""
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                return
+            model.objects.bulk_create(batch)
+            yield batch
+
+    def create(self, model, objects):
+        return sum(len(batch) for batch in self.insert(model, objects))
+
+    def create_ids(self, model, objects):
+        return [obj.pk for batch in self.insert(model, objects)
+                for obj in batch]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='variants_image',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200, verbose_name='Картинка с готовыми версиями'),
+        ),
+    ]
@@ -1,11 +1,16 @@
-from django.db import models
+from django.db import connections, models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import (RegexValidator, MinValueValidator,
                                     MaxValueValidator)
 from colorfield.fields import ColorField
 
 from ingredients.models import Ingredient
 from foodgram_backend import constants
+from foodgram_backend.counters import CountersModelMixin
 
 User = get_user_model()
 
@@ -42,8 +47,86 @@ class Tag(models.Model):
         return self.slug
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Recipe queryset."""
+    def with_related(self):
+        """Load author, tags and ingredients in a fixed number of queries."""
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            models.Prefetch(
+                'r_tags',
+                queryset=RecipeTag.objects.select_related(
+                    'tag').order_by('tag__name')
+            ),
+            models.Prefetch(
+                'r_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient').order_by('ingredient__name')
+            ),
+        )
+
+    def with_tags(self, slugs, match_all=False):
+        """Recipes having any (or every) of the tags, without DISTINCT."""
+        def has_tags(*slugs):
+            return models.Exists(RecipeTag.objects.filter(
+                recipe=models.OuterRef('pk'), tag__slug__in=slugs))
+
+        if not match_all:
+            return self.filter(has_tags(*slugs))
+        queryset = self
+        for slug in set(slugs):
+            queryset = queryset.filter(has_tags(slug))
+        return queryset
+
+    def is_postgresql(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def search(self, text):
+        """Ranked full-text search, substring match outside PostgreSQL."""
+        if not self.is_postgresql():
+            return self.annotate(
+                rank=models.Case(
+                    models.When(name__icontains=text, then=3),
+                    models.When(text__icontains=text, then=2),
+                    default=1,
+                    output_field=models.IntegerField()
+                )
+            ).filter(
+                models.Q(name__icontains=text)
+                | models.Q(text__icontains=text)
+                | models.Exists(RecipeIngredient.objects.filter(
+                    recipe=models.OuterRef('pk'),
+                    ingredient__name__icontains=text))
+            ).order_by('-rank', 'name', 'id')
+
+        query = SearchQuery(
+            text, config=constants.SEARCH_CONFIG, search_type='websearch')
+        return self.filter(search_vector=query).annotate(
+            rank=SearchRank(models.F('search_vector'), query)
+        ).order_by('-rank', 'name', 'id')
+
+    def update_search_vector(self):
+        """Rebuild stored vectors: name > text > ingredient names."""
+        if not self.is_postgresql():
+            return 0
+        ingredient_names = RecipeIngredient.objects.filter(
+            recipe=models.OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=constants.SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=constants.SEARCH_CONFIG)
+            + SearchVector(models.Subquery(ingredient_names), weight='C',
+                           config=constants.SEARCH_CONFIG)
+        ))
+
+
+class Recipe(CountersModelMixin, models.Model):
     """Recipe model."""
+    counter_fields = ('favorites_count', 'shopping_list_count')
+
     author = models.ForeignKey(
         User,
         verbose_name='Автор рецепта',
@@ -80,11 +163,40 @@ class Recipe(models.Model):
             MaxValueValidator(constants.MAX_TIME_VALIDATOR)
         )
     )
+    favorites_count = models.IntegerField(
+        'Количество добавлений в избранное',
+        default=0, editable=False
+    )
+    shopping_list_count = models.IntegerField(
+        'Количество добавлений в корзину',
+        default=0, editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True, editable=False
+    )
+    # Name of the image whose variants are generated, a new image
+    # differs from it until the worker finishes.
+    variants_image = models.CharField(
+        'Картинка с готовыми версиями',
+        max_length=constants.MEDIUM_CHAR_LEN,
+        blank=True, default='', editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('name',)
+        ordering = ('name', 'id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            GinIndex(fields=('search_vector',), name='recipe_search_idx'),
+            models.Index(fields=('name', 'id'), name='recipe_name_idx'),
+            models.Index(
+                fields=('author', 'name', 'id'),
+                name='recipe_author_name_idx'
+            ),
+        )
 
     def __str__(self) -> str:
         return self.name
@@ -150,6 +262,10 @@ class RecipeTag(models.Model):
                 name='unique_r_tag'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'), name='recipetag_tag_recipe_idx'),
+        )
 
     def __str__(self) -> str:
         return f'{self.recipe} {self.tag}'
@@ -178,6 +294,10 @@ class RecipeUser(models.Model):
                 name='unique_user_recipe_%(class)s'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'), name='%(class)s_user_recipe_idx'),
+        )
 
     def __str__(self) -> str:
         return f'{self.__class__}: {self.user} {self.recipe}'
@@ -185,7 +305,9 @@ class RecipeUser(models.Model):
 
 class ShoppingList(RecipeUser):
     """Shopping list model."""
-    class Meta:
+    counter_field = 'shopping_list_count'
+
+    class Meta(RecipeUser.Meta):
         ordering = ('recipe__name',)
         verbose_name = 'Блюдо в корзине'
         verbose_name_plural = 'Блюда в корзине'
@@ -193,7 +315,9 @@ class ShoppingList(RecipeUser):
 
 class Favorite(RecipeUser):
     """Favorites model."""
-    class Meta:
+    counter_field = 'favorites_count'
+
+    class Meta(RecipeUser.Meta):
         ordering = ('user__username',)
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram_backend import constants
+from foodgram_backend.counters import update_counter
+from foodgram_backend.versions import bump_version
+from .images import schedule_variants
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTag, ShoppingList, Tag, User)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version(constants.TAGS_VERSION_KEY))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def recipes_changed(**kwargs):
+    transaction.on_commit(
+        lambda: bump_version(constants.RECIPES_VERSION_KEY))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_save, sender=Recipe)
+def counters_increment(sender, instance, created, **kwargs):
+    if created:
+        update_recipe_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_delete, sender=Recipe)
+def counters_decrement(sender, instance, **kwargs):
+    update_recipe_counters(sender, instance, -1)
+
+
+def update_recipe_counters(sender, instance, delta):
+    if sender is Recipe:
+        update_counter(User, instance.author_id, 'recipes_count', delta)
+    else:
+        update_counter(
+            Recipe, instance.recipe_id, sender.counter_field, delta)
+
+
+def refresh_search_vector(queryset):
+    transaction.on_commit(queryset.update_search_vector)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_changed(instance, **kwargs):
+    refresh_search_vector(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredients_search_changed(instance, **kwargs):
+    refresh_search_vector(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_changed(instance, created, **kwargs):
+    if not created:
+        refresh_search_vector(
+            Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(instance, **kwargs):
+    # Edits that keep a ready image leave the worker pool alone.
+    if instance.image and instance.variants_image != instance.image.name:
+        image_name = instance.image.name
+        transaction.on_commit(lambda: schedule_variants(image_name))
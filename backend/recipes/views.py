@@ -1,13 +1,19 @@
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import AllowAny
 
+from api.mixins import (CatalogCacheMixin, ReplicaReadsMixin,
+                        SerializationTimingMixin)
+from foodgram_backend import constants
 from .models import Tag
 from .serializers import TagSerializer
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadsMixin, SerializationTimingMixin,
+                 CatalogCacheMixin, ReadOnlyModelViewSet):
     """Access Tag model."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    catalog_version_key = constants.TAGS_VERSION_KEY
+    query_budget = {'list': 1, 'retrieve': 1}
@@ -0,0 +1,112 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram_backend import constants
+
+SHARED_KEY_PREFIX = 'auth_token'
+
+
+class TokenCache:
+    """Bounded LRU of token key to (user, token) pairs with a TTL."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.data[key] = (time.monotonic() + timeout, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for key in [key for key, (_, (user, _)) in self.data.items()
+                        if user.pk == user_id]:
+                del self.data[key]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+token_cache = TokenCache(constants.TOKEN_CACHE_SIZE)
+
+
+def get_shared_key(key):
+    return f'{SHARED_KEY_PREFIX}:{key}'
+
+
+def forget_token(key):
+    """Drop a token from the local and the shared cache."""
+    token_cache.delete(key)
+    if settings.TOKEN_CACHE_SHARED:
+        cache.delete(get_shared_key(key))
+
+
+def forget_user(user_id):
+    """Drop cached tokens of a user after its data has changed."""
+    token_cache.delete_user(user_id)
+    if settings.TOKEN_CACHE_SHARED:
+        keys = Token.objects.filter(
+            user_id=user_id).values_list('key', flat=True)
+        cache.delete_many(get_shared_key(key) for key in keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication without a database query for known tokens.
+
+    Resolved tokens are kept in a per-process LRU and, with
+    TOKEN_CACHE_SHARED, in the shared cache. Both are invalidated when a
+    token is deleted or its user is saved. Changes that bypass signals,
+    such as queryset updates, stay unseen for at most TOKEN_CACHE_TTL
+    seconds from the database read, whichever cache serves the token.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None and settings.TOKEN_CACHE_SHARED:
+            shared = cache.get(get_shared_key(key))
+            if shared is not None:
+                # Copies keep the deadline of the read that filled them.
+                deadline, cached = shared
+                timeout = deadline - time.time()
+                if timeout > 0:
+                    token_cache.set(key, cached, timeout)
+                else:
+                    cached = None
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached, settings.TOKEN_CACHE_TTL)
+            if settings.TOKEN_CACHE_SHARED:
+                cache.set(
+                    get_shared_key(key),
+                    (time.time() + settings.TOKEN_CACHE_TTL, cached),
+                    settings.TOKEN_CACHE_TTL)
+        # Requests may change their user, the cached one stays intact.
+        user, token = cached
+        return copy.copy(user), token
@@ -3,10 +3,13 @@ from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 
 from foodgram_backend import constants
+from foodgram_backend.counters import CountersModelMixin
 
 
-class User(AbstractUser):
+class User(CountersModelMixin, AbstractUser):
     """User model."""
+    counter_fields = ('recipes_count', 'followers_count')
+
     password = models.CharField('Пароль', max_length=constants.SHORT_CHAR_LEN)
     username = models.CharField(
         'Никнейм',
@@ -31,6 +34,14 @@ class User(AbstractUser):
         max_length=constants.SHORT_CHAR_LEN,
         blank=False
     )
+    recipes_count = models.IntegerField(
+        'Количество рецептов',
+        default=0, editable=False
+    )
+    followers_count = models.IntegerField(
+        'Количество подписчиков',
+        default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     EMAIL_FIELD = 'email'
@@ -47,6 +58,8 @@ class User(AbstractUser):
 
 class Subscription(models.Model):
     """Subscriptions model."""
+    counter_field = 'followers_count'
+
     follower = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
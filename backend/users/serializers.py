@@ -27,8 +27,16 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return user.is_authenticated and Subscription.objects.filter(
-            follower=user,
-            author=obj
-        ).exists()
+        request = self.context['request']
+        if not request.user.is_authenticated:
+            return False
+        return obj.id in get_subscribed_ids(request)
+
+
+def get_subscribed_ids(request):
+    """Authors followed by the requesting user, fetched once per request."""
+    if not hasattr(request, 'subscribed_ids'):
+        request.subscribed_ids = set(Subscription.objects.filter(
+            follower=request.user
+        ).values_list('author_id', flat=True))
+    return request.subscribed_ids
@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram_backend import constants
+from foodgram_backend.counters import update_counter
+from foodgram_backend.versions import bump_version
+from .authentication import forget_token, forget_user
+from .models import Subscription, User
+
+PROFILE_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+
+@receiver(post_save, sender=Subscription)
+def followers_increment(instance, created, **kwargs):
+    if created:
+        update_counter(
+            User, instance.author_id, Subscription.counter_field, 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def followers_decrement(instance, **kwargs):
+    update_counter(
+        User, instance.author_id, Subscription.counter_field, -1)
+
+
+@receiver(post_save, sender=User)
+def profile_changed(created, update_fields, **kwargs):
+    """Authors are embedded in recipe responses."""
+    if created or (update_fields is not None
+                   and not PROFILE_FIELDS.intersection(update_fields)):
+        return
+    transaction.on_commit(
+        lambda: bump_version(constants.RECIPES_VERSION_KEY))
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, created, **kwargs):
+    """Password changes and deactivation reach cached tokens."""
+    if not created:
+        user_id = instance.pk
+        transaction.on_commit(lambda: forget_user(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    """Logout deletes the token, it must stop working at once."""
+    # Deletion resets the primary key before on_commit callbacks run.
+    key = instance.key
+    transaction.on_commit(lambda: forget_token(key))
@@ -3,11 +3,13 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from djoser import serializers
 
+from api.mixins import ReplicaReadsMixin, SerializationTimingMixin
 from .serializers import UserSerializer
 from .models import User
 
 
-class UserViewSet(viewsets.GenericViewSet,
+class UserViewSet(ReplicaReadsMixin, SerializationTimingMixin,
+                  viewsets.GenericViewSet,
                   mixins.CreateModelMixin,
                   mixins.ListModelMixin,
                   mixins.RetrieveModelMixin):
@@ -16,6 +18,13 @@ class UserViewSet(viewsets.GenericViewSet,
     serializer_class = UserSerializer
     permission_classes = (permissions.AllowAny,)
     lookup_field = 'id'
+    query_budget = {
+        'list': 4,
+        'retrieve': 3,
+        'me': 2,
+        'create': 5,
+        'set_password': 2,
+    }
 
     def get_permissions(self):
         if self.action == 'set_password' or self.action == 'me':
@@ -42,7 +51,9 @@ class UserViewSet(viewsets.GenericViewSet,
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        # The request user may come from the token cache, saving all its
+        # columns would roll back changes made since it was loaded.
         self.request.user.set_password(serializer.data['new_password'])
-        self.request.user.save()
+        self.request.user.save(update_fields=('password',))
 
         return Response(status=status.HTTP_204_NO_CONTENT)